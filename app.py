@@ -1,9 +1,37 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, has_request_context
+from flask.cli import AppGroup
+import click
 import psycopg2
-from flasgger import Swagger
+import psycopg2.errors
+import psycopg2.extensions
+import psycopg2.pool
+from psycopg2 import sql
+from psycopg2.extras import Json, execute_values
+import contextlib
+import csv
+import datetime
+import gzip
+import io
+import itertools
+import json
+import math
+import os
+import queue
+import random
+import re
+import select
+import threading
+import time
+import unicodedata
 
 app = Flask(__name__)
-swagger = Swagger(app)
+
+# Configurações da aplicação (BARBEARIA_AMBIENTE=producao desliga o Swagger e o modo debug)
+app_config = {
+    'producao': os.environ.get('BARBEARIA_AMBIENTE') == 'producao',
+    'openapi_arquivo': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'openapi.json'),
+}
+app_config['swagger'] = os.environ.get('BARBEARIA_SWAGGER', '0' if app_config['producao'] else '1') == '1'
 
 
 # Configurações do banco de dados
@@ -13,30 +41,601 @@ db_config = {
     'user': 'postgres',
     'password': '',
     'port': '',
+    'connect_timeout': 5,
 }
 
-# Conexão com o banco de dados
-def connect_to_database():
-    try:
-        connection = psycopg2.connect(**db_config)
-        print("Conexão com o banco de dados PostgreSQL estabelecida com sucesso!")
+# Réplicas de leitura, com os mesmos campos de db_config. Sem réplicas, todas as leituras vão para o primário.
+replica_configs = [
+    # {'host': 'replica1', 'database': 'Cabeleireiro', 'user': 'postgres', 'password': '', 'port': '', 'connect_timeout': 5},
+]
+
+replica_config = {
+    'janela_leitura_propria': 5,    # segundos após uma escrita em que as leituras do cliente vão para o primário
+    'atraso_maximo': 2.0,           # atraso de replicação (segundos) acima do qual a réplica não é usada
+    'intervalo_verificacao': 5,     # segundos entre medições do atraso de cada réplica
+    'cookie': 'barbearia_escrita',  # cookie com o horário da última escrita do cliente
+}
+
+# Configurações do pool de conexões e do controle de admissão
+pool_config = {
+    'minimo': 1,            # conexões abertas na criação do pool; as devolvidas ficam no pool até o máximo
+    'maximo': 10,           # máximo de requisições usando o banco ao mesmo tempo
+    'espera_maxima': 2.0,   # segundos aguardando uma conexão livre antes de responder 503
+    'retry_after': 5,       # segundos informados no cabeçalho Retry-After quando a requisição é rejeitada
+}
+
+# Tempos limite (em milissegundos) aplicados às consultas de cada rota
+timeouts_padrao = {'statement_timeout': 5000, 'lock_timeout': 1000}
+timeouts_rotas = {
+    'consultar_agendamentos': {'statement_timeout': 10000, 'lock_timeout': 1000},
+    'importar_usuarios': {'statement_timeout': 60000, 'lock_timeout': 5000},
+}
+
+# Configurações do disjuntor (circuit breaker) da conexão com o banco
+disjuntor_config = {
+    'limite_falhas': 5,     # falhas seguidas até abrir o circuito
+    'tempo_aberto': 30,     # segundos com o circuito aberto antes de tentar conectar novamente
+}
+
+
+class ServicoIndisponivel(Exception):
+    """Requisição rejeitada rapidamente porque o banco está sobrecarregado ou fora do ar."""
+
+    def __init__(self, mensagem, retry_after):
+        super().__init__(mensagem)
+        self.mensagem = mensagem
+        self.retry_after = retry_after
+
+
+class Disjuntor:
+    """Abre o circuito após falhas seguidas de conexão e rejeita novas tentativas até o tempo acabar."""
+
+    def __init__(self, limite_falhas, tempo_aberto):
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self.falhas = 0
+        self.aberto_ate = 0.0
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """Retorna 0 se a conexão pode ser tentada, senão os segundos que faltam para o circuito fechar."""
+        with self._lock:
+            if self.falhas < self.limite_falhas:
+                return 0
+            agora = time.monotonic()
+            if agora < self.aberto_ate:
+                return math.ceil(self.aberto_ate - agora)
+            # Meio-aberto: libera uma única tentativa e mantém as demais bloqueadas
+            self.aberto_ate = agora + self.tempo_aberto
+            return 0
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self.falhas = 0
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas += 1
+            if self.falhas >= self.limite_falhas:
+                self.aberto_ate = time.monotonic() + self.tempo_aberto
+
+
+class ConexaoPool(psycopg2.extensions.connection):
+    """Conexão que volta para o pool quando a rota chama close()."""
+
+    devolver = None
+    emprestimo = None       # identifica o empréstimo atual; None quando a conexão não está emprestada
+    dentro_do_pool = False
+
+    def close(self):
+        devolver, self.devolver = self.devolver, None
+        if devolver is not None:
+            devolver(self)
+        elif not self.dentro_do_pool:
+            # Só fecha de verdade conexões que não estão no pool (descartadas ou fora dele)
+            self._fechar()
+
+    def _fechar(self):
+        psycopg2.extensions.connection.close(self)
+
+
+class PoolConexoes(psycopg2.pool.ThreadedConnectionPool):
+    """
+    Pool que mantém ociosas até maxconn conexões devolvidas e marca quais estão dentro dele.
+
+    O ThreadedConnectionPool fecha toda conexão devolvida além de minconn, o que faria cada pico de
+    requisições abrir conexões novas. _getconn e _putconn rodam com o lock do pool, então a marcação
+    dentro_do_pool não pode ser atropelada por outra thread pegando a mesma conexão.
+    """
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.minconn = self.maxconn
+
+    def _getconn(self, key=None):
+        connection = super()._getconn(key)
+        connection.dentro_do_pool = False
         return connection
+
+    def _putconn(self, conn, key=None, close=False):
+        # Uma conexão descartada pelo pool chega aqui com dentro_do_pool False, então o close() a fecha
+        super()._putconn(conn, key, close)
+        conn.dentro_do_pool = any(c is conn for c in self._pool)
+
+    def _closeall(self):
+        for connection in self._pool:
+            connection.dentro_do_pool = False
+        super()._closeall()
+
+
+class BancoDados:
+    """Servidor PostgreSQL (primário ou réplica) com seu próprio pool de conexões e disjuntor."""
+
+    def __init__(self, nome, config):
+        self.nome = nome
+        self.config = config
+        self.disjuntor = Disjuntor(disjuntor_config['limite_falhas'], disjuntor_config['tempo_aberto'])
+        self.atraso = 0.0
+        self.atraso_medido_em = float('-inf')
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = PoolConexoes(
+                        pool_config['minimo'], pool_config['maximo'],
+                        connection_factory=ConexaoPool, **self.config
+                    )
+                    print(f"Pool de conexões com o banco de dados PostgreSQL ({self.nome}) criado com sucesso!")
+        return self._pool
+
+
+_admissao = threading.BoundedSemaphore(pool_config['maximo'])
+_conexoes_em_uso = {}
+_conexoes_lock = threading.Lock()
+conexoes_metricas = {'vazadas': 0}
+_primario = BancoDados('primario', db_config)
+_replicas = [BancoDados(f'replica{i + 1}', config) for i, config in enumerate(replica_configs)]
+_proxima_replica = itertools.count()
+
+
+def _devolver_ao_pool(banco, connection):
+    # Desfaz transações pendentes antes de devolver; conexões quebradas são descartadas
+    descartar = bool(connection.closed)
+    if not descartar and connection.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            connection.rollback()
+        except psycopg2.Error:
+            descartar = True
+    banco.pool().putconn(connection, close=descartar)
+
+
+def _devolver_conexao(connection):
+    connection.emprestimo = None
+    with _conexoes_lock:
+        _conexoes_em_uso.pop(id(connection), None)
+    try:
+        _devolver_ao_pool(connection.banco, connection)
+    finally:
+        _admissao.release()
+
+
+def _aplicar_timeouts(connection):
+    endpoint = request.endpoint if has_request_context() else None
+    timeouts = timeouts_rotas.get(endpoint, timeouts_padrao)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SET statement_timeout = %s; SET lock_timeout = %s;",
+            (timeouts['statement_timeout'], timeouts['lock_timeout'])
+        )
+
+
+def _conectar(banco):
+    try:
+        connection = banco.pool().getconn()
     except psycopg2.Error as e:
-        print(f"Erro ao conectar ao banco de dados: {e}")
+        banco.disjuntor.registrar_falha()
+        print(f"Erro ao conectar ao banco de dados ({banco.nome}): {e}")
+        return None
+
+    try:
+        _aplicar_timeouts(connection)
+    except psycopg2.Error as e:
+        _devolver_ao_pool(banco, connection)
+        banco.disjuntor.registrar_falha()
+        print(f"Erro ao conectar ao banco de dados ({banco.nome}): {e}")
+        return None
+
+    banco.disjuntor.registrar_sucesso()
+    connection.banco = banco
+    return connection
+
+
+def _atraso_aceitavel(banco, connection):
+    # O atraso de replicação é medido no máximo uma vez a cada intervalo_verificacao por réplica
+    agora = time.monotonic()
+    if agora - banco.atraso_medido_em >= replica_config['intervalo_verificacao']:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT CASE
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                END;
+                """
+            )
+            banco.atraso = float(cursor.fetchone()[0])
+        banco.atraso_medido_em = agora
+    return banco.atraso <= replica_config['atraso_maximo']
+
+
+def _conectar_replica():
+    inicio = next(_proxima_replica)
+    for i in range(len(_replicas)):
+        banco = _replicas[(inicio + i) % len(_replicas)]
+        if banco.disjuntor.permitir():
+            continue
+
+        connection = _conectar(banco)
+        if connection is None:
+            continue
+
+        try:
+            if _atraso_aceitavel(banco, connection):
+                return connection
+            print(f"Réplica {banco.nome} atrasada {banco.atraso:.1f}s, usando outra conexão")
+        except psycopg2.Error as e:
+            banco.disjuntor.registrar_falha()
+            print(f"Erro ao medir atraso da réplica {banco.nome}: {e}")
+        _devolver_ao_pool(banco, connection)
+    return None
+
+
+# Leituras feitas logo após uma escrita do mesmo cliente vão para o primário (read-your-writes)
+def _leitura_no_primario():
+    if not has_request_context():
+        return False
+    if g.get('escreveu'):
+        return True
+    try:
+        ultima_escrita = float(request.cookies.get(replica_config['cookie'], 0))
+    except ValueError:
+        return False
+    return time.time() - ultima_escrita < replica_config['janela_leitura_propria']
+
+
+# Conexão com o banco de dados. Rotas somente de leitura podem ser atendidas por uma réplica.
+def connect_to_database(somente_leitura=False):
+    usar_replica = somente_leitura and bool(_replicas) and not _leitura_no_primario()
+
+    espera = 0 if usar_replica else _primario.disjuntor.permitir()
+    if espera:
+        raise ServicoIndisponivel('Banco de dados indisponível', espera)
+
+    if not _admissao.acquire(timeout=pool_config['espera_maxima']):
+        raise ServicoIndisponivel('Servidor sobrecarregado, tente novamente', pool_config['retry_after'])
+
+    connection = _conectar_replica() if usar_replica else None
+    if connection is None:
+        espera = _primario.disjuntor.permitir() if usar_replica else 0
+        if espera:
+            _admissao.release()
+            raise ServicoIndisponivel('Banco de dados indisponível', espera)
+        connection = _conectar(_primario)
+
+    if connection is None:
+        _admissao.release()
         return None
 
+    # O pool devolve as conexões em ordem LIFO, então a mesma conexão pode ser emprestada a outra requisição
+    # logo depois de devolvida; o objeto do empréstimo distingue cada uso
+    emprestimo = object()
+    connection.emprestimo = emprestimo
+    connection.devolver = _devolver_conexao
+    dono = request.endpoint if has_request_context() else threading.current_thread().name
+    with _conexoes_lock:
+        _conexoes_em_uso[id(connection)] = (dono, time.monotonic())
+    if has_request_context():
+        g.setdefault('conexoes', []).append((connection, emprestimo))
+        if not somente_leitura:
+            g.escreveu = True
+    return connection
+
+
+class ErroConexao(Exception):
+    """Não foi possível obter uma conexão com o banco de dados."""
+
+
+# Transação usada por todas as rotas: commit ao final do bloco, rollback se houver exceção e a conexão
+# sempre volta para o pool. Dentro de uma requisição, blocos aninhados reaproveitam a transação aberta.
+@contextlib.contextmanager
+def transacao(somente_leitura=False):
+    aberta = g.get('transacao') if has_request_context() else None
+    if aberta is not None:
+        with aberta.cursor() as cursor:
+            yield cursor
+        return
+
+    connection = connect_to_database(somente_leitura=somente_leitura)
+    if connection is None:
+        raise ErroConexao('Erro ao conectar ao banco de dados')
+    if has_request_context():
+        g.transacao = connection
+
+    try:
+        with connection.cursor() as cursor:
+            if somente_leitura:
+                cursor.execute("SET TRANSACTION READ ONLY;")
+            yield cursor
+        connection.commit()
+    except BaseException:
+        if not connection.closed:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                pass
+        raise
+    finally:
+        if has_request_context():
+            g.pop('transacao', None)
+        connection.close()
+
+
+# Conexões fora do pool há mais de alerta_segundos indicam uma rota ou tarefa presa ou que não as devolve
+def conexoes_em_uso(alerta_segundos=30):
+    agora = time.monotonic()
+    with _conexoes_lock:
+        em_uso = list(_conexoes_em_uso.values())
+    return {
+        'em_uso': len(em_uso),
+        'vazadas': conexoes_metricas['vazadas'],
+        'presas': [
+            {'dono': dono, 'segundos': round(agora - desde, 1)}
+            for dono, desde in em_uso if agora - desde > alerta_segundos
+        ],
+    }
+
+
+@app.errorhandler(ServicoIndisponivel)
+def servico_indisponivel(e):
+    return jsonify({'error': e.mensagem}), 503, {'Retry-After': str(e.retry_after)}
+
+
+@app.errorhandler(ErroConexao)
+def erro_conexao(e):
+    return jsonify({'error': 'Erro ao conectar ao banco de dados'}), 500
+
+
+# Erros do banco que escapam das rotas; tempo limite de consulta ou de lock vira 503 para o cliente tentar de novo
+@app.errorhandler(psycopg2.Error)
+def erro_banco_de_dados(e):
+    if isinstance(e, (psycopg2.errors.QueryCanceled, psycopg2.errors.LockNotAvailable)):
+        print(f"Tempo limite excedido em {request.endpoint}: {e}")
+        return jsonify({'error': 'Banco de dados sobrecarregado, tente novamente'}), 503, {'Retry-After': str(pool_config['retry_after'])}
+    print(f"Erro no banco de dados em {request.endpoint}: {e}")
+    return jsonify({'error': 'Erro interno no servidor'}), 500
+
+
+# Marca o cliente que acabou de escrever para que suas próximas leituras usem o primário
+@app.after_request
+def marcar_escrita(response):
+    if g.get('escreveu'):
+        response.set_cookie(
+            replica_config['cookie'], str(time.time()),
+            max_age=replica_config['janela_leitura_propria'], httponly=True
+        )
+    return response
+
+
+# Devolve ao pool as conexões que uma rota deixou abertas e registra o vazamento
+@app.teardown_request
+def devolver_conexoes_pendentes(exc):
+    for connection, emprestimo in g.pop('conexoes', []):
+        if connection.emprestimo is emprestimo:
+            with _conexoes_lock:
+                conexoes_metricas['vazadas'] += 1
+            print(f"Conexão não devolvida pela rota {request.endpoint}, devolvendo ao pool")
+            connection.close()
+
+
+#---------------------------------------LIMITE DE REQUISIÇÕES---------------------------------------------
+
+# Limites por rota no formato token bucket: 'capacidade' é a rajada permitida e 'taxa' os tokens repostos
+# por segundo. 'por' define quem é limitado: api_key (cabeçalho X-API-Key), ip ou cpf (corpo JSON ou URL).
+# Atrás de um proxy reverso, configure o werkzeug ProxyFix para que o ip seja o do cliente.
+limites_rotas = {
+    'cadastrar_agendamento': [
+        {'por': 'api_key', 'capacidade': 60, 'taxa': 1.0},
+        {'por': 'ip', 'capacidade': 30, 'taxa': 0.5},
+        {'por': 'cpf', 'capacidade': 5, 'taxa': 0.05},
+    ],
+    'consultar_agendamentos': [
+        {'por': 'api_key', 'capacidade': 120, 'taxa': 2.0},
+        {'por': 'ip', 'capacidade': 60, 'taxa': 1.0},
+    ],
+    # A regra por ip também vale para quem não envia X-API-Key ou troca de chave a cada requisição
+    'importar_usuarios': [
+        {'por': 'api_key', 'capacidade': 2, 'taxa': 0.01},
+        {'por': 'ip', 'capacidade': 2, 'taxa': 0.01},
+    ],
+}
+
+
+class BaldesMemoria:
+    """Token buckets guardados na memória do processo; cada worker tem os seus próprios baldes."""
+
+    intervalo_limpeza = 60
+
+    def __init__(self):
+        self._baldes = {}
+        self._lock = threading.Lock()
+        self._proxima_limpeza = time.monotonic() + self.intervalo_limpeza
+
+    def consumir(self, baldes):
+        """
+        Recebe [(chave, capacidade, taxa)] e consome um token de cada balde só se todos tiverem um.
+        Retorna (permitido, tokens restantes de cada balde); uma requisição recusada não altera nem cria baldes.
+        """
+        agora = time.monotonic()
+        with self._lock:
+            restantes = []
+            for chave, capacidade, taxa in baldes:
+                tokens, atualizado = self._baldes.get(chave, (capacidade, agora))
+                restantes.append(min(capacidade, tokens + (agora - atualizado) * taxa))
+            permitido = all(tokens >= 1 for tokens in restantes)
+            if permitido:
+                restantes = [tokens - 1 for tokens in restantes]
+                for (chave, _, _), tokens in zip(baldes, restantes):
+                    self._baldes[chave] = (tokens, agora)
+
+            # Baldes parados há muito tempo já estariam cheios e podem ser descartados
+            if agora >= self._proxima_limpeza:
+                self._proxima_limpeza = agora + self.intervalo_limpeza
+                limite = agora - 3600
+                self._baldes = {c: b for c, b in self._baldes.items() if b[1] >= limite}
+        return permitido, restantes
+
+
+class BaldesRedis:
+    """
+    Token buckets compartilhados entre workers e servidores através de um Redis (requer o pacote redis).
+
+    Se o Redis falhar, a requisição não é recusada nem liberada sem limite: o processo passa a usar baldes
+    na memória (como BaldesMemoria) até o Redis voltar a responder.
+    """
+
+    timeout = 0.2  # segundos; um Redis lento não deve segurar as requisições
+
+    # KEYS são os baldes e ARGV os pares capacidade, taxa de cada um; grava só se todos tiverem token
+    _script = """
+        local relogio = redis.call('TIME')
+        local agora = tonumber(relogio[1]) + tonumber(relogio[2]) / 1000000
+        local permitido = 1
+        local restantes = {}
+        for i = 1, #KEYS do
+            local capacidade = tonumber(ARGV[2 * i - 1])
+            local taxa = tonumber(ARGV[2 * i])
+            local balde = redis.call('HMGET', KEYS[i], 'tokens', 'atualizado')
+            local tokens = tonumber(balde[1]) or capacidade
+            local atualizado = tonumber(balde[2]) or agora
+            restantes[i] = math.min(capacidade, tokens + (agora - atualizado) * taxa)
+            if restantes[i] < 1 then
+                permitido = 0
+            end
+        end
+        local resposta = {permitido}
+        for i = 1, #KEYS do
+            if permitido == 1 then
+                local capacidade = tonumber(ARGV[2 * i - 1])
+                local taxa = tonumber(ARGV[2 * i])
+                restantes[i] = restantes[i] - 1
+                redis.call('HSET', KEYS[i], 'tokens', tostring(restantes[i]), 'atualizado', tostring(agora))
+                redis.call('EXPIRE', KEYS[i], math.ceil((capacidade - restantes[i]) / taxa) + 1)
+            end
+            resposta[i + 1] = tostring(restantes[i])
+        end
+        return resposta
+    """
+
+    def __init__(self, url):
+        import redis
+        cliente = redis.Redis.from_url(url, socket_timeout=self.timeout, socket_connect_timeout=self.timeout)
+        self._consumir = cliente.register_script(self._script)
+        self._erros = redis.RedisError
+        self._reserva = BaldesMemoria()
+        self._indisponivel = False
+
+    def consumir(self, baldes):
+        """Mesmo contrato de BaldesMemoria.consumir, executado atomicamente no Redis."""
+        chaves = [f'limite:{chave}' for chave, _, _ in baldes]
+        argumentos = [valor for _, capacidade, taxa in baldes for valor in (capacidade, taxa)]
+        try:
+            permitido, *tokens = self._consumir(keys=chaves, args=argumentos)
+        except self._erros as e:
+            if not self._indisponivel:
+                self._indisponivel = True
+                print(f"Redis indisponível ({e}), limites de requisições contados por processo")
+            return self._reserva.consumir(baldes)
+
+        if self._indisponivel:
+            self._indisponivel = False
+            print("Redis disponível novamente, limites de requisições compartilhados")
+        return permitido == 1, [float(restantes) for restantes in tokens]
+
+
+# BARBEARIA_REDIS_URL compartilha os limites entre todos os workers; sem ela, cada processo conta os seus
+baldes = BaldesRedis(os.environ['BARBEARIA_REDIS_URL']) if os.environ.get('BARBEARIA_REDIS_URL') else BaldesMemoria()
+
+
+def _identificar_cliente(por):
+    if por == 'api_key':
+        return request.headers.get('X-API-Key') or None
+    if por == 'ip':
+        return request.remote_addr
+    if por == 'cpf':
+        cpf = (request.view_args or {}).get('cpf')
+        if cpf is None:
+            corpo = request.get_json(silent=True)
+            cpf = corpo.get('cpf') if isinstance(corpo, dict) else None
+        if not cpf:
+            return None
+        return re.sub(r'\D', '', str(cpf)) or None
+    return None
+
+
+@app.before_request
+def aplicar_limites():
+    regras = limites_rotas.get(request.endpoint)
+    if not regras:
+        return None
+
+    aplicaveis = []
+    for regra in regras:
+        identificador = _identificar_cliente(regra['por'])
+        if identificador is not None:
+            aplicaveis.append((regra, f"{request.endpoint}:{regra['por']}:{identificador}"))
+    if not aplicaveis:
+        return None
+
+    # Todas as regras são verificadas juntas: uma requisição recusada por uma regra não gasta tokens das outras
+    permitido, tokens = baldes.consumir([(chave, regra['capacidade'], regra['taxa']) for regra, chave in aplicaveis])
+
+    # Os cabeçalhos informam o limite mais próximo de ser atingido, que é o que recusou a requisição
+    restantes, indice = min((restantes, i) for i, restantes in enumerate(tokens))
+    g.limite = (aplicaveis[indice][0], restantes)
+    if not permitido:
+        return jsonify({'error': 'Limite de requisições excedido, tente novamente mais tarde'}), 429
+    return None
+
+
+@app.after_request
+def cabecalhos_limite(response):
+    if 'limite' in g:
+        regra, tokens = g.limite
+        response.headers['RateLimit-Limit'] = str(regra['capacidade'])
+        response.headers['RateLimit-Remaining'] = str(int(tokens))
+        response.headers['RateLimit-Reset'] = str(math.ceil((regra['capacidade'] - tokens) / regra['taxa']))
+        if response.status_code == 429:
+            response.headers['Retry-After'] = str(math.ceil((1 - tokens) / regra['taxa']))
+    return response
+
 
 #---------------------------------------AGENDAMENTOS tabela 1----------------------------------------------------
 
 '''
 TABLE Agendamento (
-  Id_Agendamento SERIAL PRIMARY KEY,
+  Id_Agendamento SERIAL,
   CPF VARCHAR(14) REFERENCES Usuario(CPF),
   Hora_Agendamento TIME,
-  Data_Agendamento DATE,
+  Data_Agendamento DATE NOT NULL,
   Valor DECIMAL(10, 2),
-  Servico VARCHAR(100)
-);
+  Servico VARCHAR(100),
+  PRIMARY KEY (Id_Agendamento, Data_Agendamento)
+) PARTITION BY RANGE (Data_Agendamento);
+
+TABLE agendamento_padrao PARTITION OF Agendamento DEFAULT;
 '''
 
 '''
@@ -80,34 +679,22 @@ def obter_cpf_pelo_id_agendamento(id_agendamento):
               type: string
               description: Mensagem de erro
     """
-    connection = connect_to_database()
-    if connection is None:
-        return jsonify({'error': 'Erro ao conectar ao banco de dados'}), 500
-
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT Usuario.CPF
-                FROM Agendamento
-                JOIN Usuario ON Agendamento.CPF = Usuario.CPF
-                WHERE Agendamento.Id_Agendamento = %s;
-                """,
-                (id_agendamento,)
-            )
-            cpf_usuario = cursor.fetchone()
-
-        if cpf_usuario:
-            return jsonify({'CPF': cpf_usuario[0]}), 200
-        else:
-            return jsonify({'error': 'Agendamento não encontrado'}), 404
-
-    except psycopg2.Error as e:
-        print(f"Erro ao obter CPF pelo Id_Agendamento: {e}")
-        return jsonify({'error': 'Erro interno no servidor'}), 500
-
-    finally:
-        connection.close()
+    with transacao(somente_leitura=True) as cursor:
+        cursor.execute(
+            """
+            SELECT Usuario.CPF
+            FROM Agendamento
+            JOIN Usuario ON Agendamento.CPF = Usuario.CPF
+            WHERE Agendamento.Id_Agendamento = %s;
+            """,
+            (id_agendamento,)
+        )
+        cpf_usuario = cursor.fetchone()
+
+    if cpf_usuario:
+        return jsonify({'CPF': cpf_usuario[0]}), 200
+    else:
+        return jsonify({'error': 'Agendamento não encontrado'}), 404
 
 # Rota para cadastrar um novo agendamento
 @app.route('/agendamentos', methods=['POST'])
@@ -170,31 +757,31 @@ def cadastrar_agendamento():
     if 'cpf' not in data or 'hora' not in data or 'data' not in data or 'valor' not in data or 'servico' not in data:
         return jsonify({'error': 'Campos incompletos'}), 400
 
-    connection = connect_to_database()
-    if connection is None:
-        return jsonify({'error': 'Erro ao conectar ao banco de dados'}), 500
-
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                INSERT INTO Agendamento (CPF, Hora_Agendamento, Data_Agendamento, Valor, Servico)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING Id_Agendamento;
-                """,
-                (data['cpf'], data['hora'], data['data'], data['valor'], data['servico'])
-            )
-            agendamento_id = cursor.fetchone()[0]
-            connection.commit()
-
-        return jsonify({'id_agendamento': agendamento_id}), 201
-
-    except psycopg2.Error as e:
-        print(f"Erro ao cadastrar agendamento: {e}")
-        return jsonify({'error': 'Erro interno no servidor'}), 500
-
-    finally:
-        connection.close()
+    with transacao() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO Agendamento (CPF, Hora_Agendamento, Data_Agendamento, Valor, Servico)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING Id_Agendamento;
+            """,
+            (chave_cpf(data['cpf']), data['hora'], data['data'], data['valor'], data['servico'])
+        )
+        agendamento_id = cursor.fetchone()[0]
+
+        # Confirmação, auditoria e relatório rodam depois da resposta (ver TAREFAS ASSÍNCRONAS)
+        ids_outbox = registrar_outbox(cursor, ['confirmacao', 'auditoria', 'relatorio'], {
+            'Id_Agendamento': agendamento_id,
+            'CPF': chave_cpf(data['cpf']),
+            'Hora_Agendamento': data['hora'],
+            'Data_Agendamento': data['data'],
+            'Valor': data['valor'],
+            'Servico': data['servico'],
+        })
+
+    for id_outbox in ids_outbox:
+        fila.enfileirar(id_outbox)
+
+    return jsonify({'id_agendamento': agendamento_id}), 201
 
 '''
 O recurso2 deve disponibilizar a operação de GET em que todos os registros da Tabela 1 devem ser retornados como uma lista de objetos JSON (get_all).
@@ -241,35 +828,23 @@ def consultar_agendamentos():
               type: string
               description: Mensagem de erro
     """
-    connection = connect_to_database()
-    if connection is None:
-        return jsonify({'error': 'Erro ao conectar ao banco de dados'}), 500
-
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM Agendamento;")
-            agendamentos = cursor.fetchall()
-
-        agendamentos_list = []
-        for agendamento in agendamentos:
-            agendamento_dict = {
-                'Id_Agendamento': agendamento[0],
-                'CPF': agendamento[1],
-                'Hora_Agendamento': str(agendamento[2]),
-                'Data_Agendamento': str(agendamento[3]),
-                'Valor': float(agendamento[4]),
-                'Servico': agendamento[5]
-            }
-            agendamentos_list.append(agendamento_dict)
-
-        return jsonify(agendamentos_list).json, 200
-
-    except psycopg2.Error as e:
-        print(f"Erro ao consultar agendamentos: {e}")
-        return jsonify({'error': 'Erro interno no servidor'}), 500
-
-    finally:
-        connection.close()
+    with transacao(somente_leitura=True) as cursor:
+        cursor.execute("SELECT * FROM Agendamento;")
+        agendamentos = cursor.fetchall()
+
+    agendamentos_list = []
+    for agendamento in agendamentos:
+        agendamento_dict = {
+            'Id_Agendamento': agendamento[0],
+            'CPF': agendamento[1],
+            'Hora_Agendamento': str(agendamento[2]),
+            'Data_Agendamento': str(agendamento[3]),
+            'Valor': float(agendamento[4]),
+            'Servico': agendamento[5]
+        }
+        agendamentos_list.append(agendamento_dict)
+
+    return jsonify(agendamentos_list).json, 200
 
 '''
 O recurso3 deve disponibilizar as operações de PUT e DELETE. As operações devem ser capazes de atualizar e apagar da Tabela 1.
@@ -347,45 +922,41 @@ def atualizar_agendamento(id_agendamento):
     if not data:
         return jsonify({'error': 'Nenhum dado para atualização fornecido'}), 400
 
-    connection = connect_to_database()
-    if connection is None:
-        return jsonify({'error': 'Erro ao conectar ao banco de dados'}), 500
-
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM Agendamento WHERE Id_Agendamento = %s;", (id_agendamento,))
-            agendamento = cursor.fetchone()
+    with transacao() as cursor:
+        cursor.execute("SELECT * FROM Agendamento WHERE Id_Agendamento = %s;", (id_agendamento,))
+        agendamento = cursor.fetchone()
 
         if not agendamento:
             return jsonify({'error': 'Agendamento não encontrado'}), 404
 
-        with connection.cursor() as cursor:
-            update_query = """
-                UPDATE Agendamento
-                SET CPF = %s, Hora_Agendamento = %s, Data_Agendamento = %s, Valor = %s, Servico = %s
-                WHERE Id_Agendamento = %s;
-            """
-            cursor.execute(
-                update_query,
-                (
-                    data.get('cpf', agendamento[1]),
-                    data.get('hora', agendamento[2]),
-                    data.get('data', agendamento[3]),
-                    data.get('valor', agendamento[4]),
-                    data.get('servico', agendamento[5]),
-                    id_agendamento
-                )
+        update_query = """
+            UPDATE Agendamento
+            SET CPF = %s, Hora_Agendamento = %s, Data_Agendamento = %s, Valor = %s, Servico = %s
+            WHERE Id_Agendamento = %s
+            RETURNING *;
+        """
+        cursor.execute(
+            update_query,
+            (
+                chave_cpf(data['cpf']) if 'cpf' in data else agendamento[1],
+                data.get('hora', agendamento[2]),
+                data.get('data', agendamento[3]),
+                data.get('valor', agendamento[4]),
+                data.get('servico', agendamento[5]),
+                id_agendamento
             )
-            connection.commit()
+        )
+        atualizado = cursor.fetchone()
 
-        return jsonify({'message': 'Agendamento atualizado com sucesso'}), 200
+        # O relatório desfaz os dados anteriores e soma os novos (ver TAREFAS ASSÍNCRONAS)
+        carga = carga_agendamento(atualizado)
+        carga.update(Operacao='UPDATE', Anterior=carga_agendamento(agendamento))
+        ids_outbox = registrar_outbox(cursor, ['auditoria', 'relatorio'], carga)
 
-    except psycopg2.Error as e:
-        print(f"Erro ao atualizar agendamento: {e}")
-        return jsonify({'error': 'Erro interno no servidor'}), 500
+    for id_outbox in ids_outbox:
+        fila.enfileirar(id_outbox)
 
-    finally:
-        connection.close()
+    return jsonify({'message': 'Agendamento atualizado com sucesso'}), 200
 
 
 # Rota para excluir um agendamento pelo Id_Agendamento
@@ -425,30 +996,23 @@ def excluir_agendamento(id_agendamento):
               type: string
               description: Mensagem de erro
     """
-    connection = connect_to_database()
-    if connection is None:
-        return jsonify({'error': 'Erro ao conectar ao banco de dados'}), 500
-
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM Agendamento WHERE Id_Agendamento = %s;", (id_agendamento,))
-            agendamento = cursor.fetchone()
+    with transacao() as cursor:
+        cursor.execute("SELECT * FROM Agendamento WHERE Id_Agendamento = %s;", (id_agendamento,))
+        agendamento = cursor.fetchone()
 
         if not agendamento:
             return jsonify({'error': 'Agendamento não encontrado'}), 404
 
-        with connection.cursor() as cursor:
-            cursor.execute("DELETE FROM Agendamento WHERE Id_Agendamento = %s;", (id_agendamento,))
-            connection.commit()
+        cursor.execute("DELETE FROM Agendamento WHERE Id_Agendamento = %s;", (id_agendamento,))
 
-        return jsonify({'message': 'Agendamento excluído com sucesso'}), 200
+        carga = carga_agendamento(agendamento)
+        carga['Operacao'] = 'DELETE'
+        ids_outbox = registrar_outbox(cursor, ['auditoria', 'relatorio'], carga)
 
-    except psycopg2.Error as e:
-        print(f"Erro ao excluir agendamento: {e}")
-        return jsonify({'error': 'Erro interno no servidor'}), 500
+    for id_outbox in ids_outbox:
+        fila.enfileirar(id_outbox)
 
-    finally:
-        connection.close()
+    return jsonify({'message': 'Agendamento excluído com sucesso'}), 200
 
 # Rota para consultar um agendamento pelo Id_Agendamento => Endpoint EXTRA
 @app.route('/agendamentos/<int:id_agendamento>', methods=['GET']) 
@@ -504,39 +1068,27 @@ def consultar_agendamento(id_agendamento):
               type: string
               description: Mensagem de erro
     """
-    connection = connect_to_database()
-    if connection is None:
-        return jsonify({'error': 'Erro ao conectar ao banco de dados'}), 500
-
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT * FROM Agendamento WHERE Id_Agendamento = %s;
-                """,
-                (id_agendamento,)
-            )
-            agendamento = cursor.fetchone()
-
-        if agendamento:
-            agendamento_dict = {
-                'Id_Agendamento': agendamento[0],
-                'CPF': agendamento[1],
-                'Hora_Agendamento': str(agendamento[2]),
-                'Data_Agendamento': str(agendamento[3]),
-                'Valor': float(agendamento[4]),
-                'Servico': agendamento[5]
-            }
-            return jsonify(agendamento_dict), 200
-        else:
-            return jsonify({'error': 'Agendamento não encontrado'}), 404
-
-    except psycopg2.Error as e:
-        print(f"Erro ao consultar agendamento: {e}")
-        return jsonify({'error': 'Erro interno no servidor'}), 500
-
-    finally:
-        connection.close()
+    with transacao(somente_leitura=True) as cursor:
+        cursor.execute(
+            """
+            SELECT * FROM Agendamento WHERE Id_Agendamento = %s;
+            """,
+            (id_agendamento,)
+        )
+        agendamento = cursor.fetchone()
+
+    if agendamento:
+        agendamento_dict = {
+            'Id_Agendamento': agendamento[0],
+            'CPF': agendamento[1],
+            'Hora_Agendamento': str(agendamento[2]),
+            'Data_Agendamento': str(agendamento[3]),
+            'Valor': float(agendamento[4]),
+            'Servico': agendamento[5]
+        }
+        return jsonify(agendamento_dict), 200
+    else:
+        return jsonify({'error': 'Agendamento não encontrado'}), 404
     
 
 #---------------------------------------USUÁRIOS Tabela 2---------------------------------------------
@@ -555,6 +1107,9 @@ TABLE Usuario (
 
 '''
 O recurso 4 deve disponibilizar as operações de GET, POST, PUT e DELETE na Tabela 2.
+
+O CPF é gravado no formato 000.000.000-00 (ver normalizar_cpf e a migração 0004). As rotas aceitam o CPF com
+ou sem pontuação e o convertem com chave_cpf antes de consultar ou gravar.
 '''
 # Método GET para consultar um usuário pelo CPF
 @app.route('/usuario/<cpf>', methods=['GET'])
@@ -609,26 +1164,21 @@ def get_usuario(cpf):
         description: Erro interno no servidor
         schema:
           properties:
-            message:
+            error:
               type: string
               description: Mensagem de erro
     """
-    connection = connect_to_database()
-    if connection:
-        cursor = connection.cursor()
-        cursor.execute("SELECT Nome, CPF, Telefone, Email, Data_Nascimento, Genero, Senha FROM Usuario WHERE CPF = %s;", (cpf,))
+    with transacao(somente_leitura=True) as cursor:
+        cursor.execute("SELECT Nome, CPF, Telefone, Email, Data_Nascimento, Genero, Senha FROM Usuario WHERE CPF = %s;", (chave_cpf(cpf),))
         user = cursor.fetchone()
-        connection.close()
-        if user:
-            
-            keys = ['Nome', 'CPF', 'Telefone', 'Email', 'Data_Nascimento', 'Genero', 'Senha']
-            user_dict = dict(zip(keys, user))
-            print(jsonify(user_dict).json)
-            return jsonify(user_dict).json, 200
-        else:
-            return jsonify({'message': 'Usuário não encontrado'}), 404
+
+    if user:
+        keys = ['Nome', 'CPF', 'Telefone', 'Email', 'Data_Nascimento', 'Genero', 'Senha']
+        user_dict = dict(zip(keys, user))
+        print(jsonify(user_dict).json)
+        return jsonify(user_dict).json, 200
     else:
-        return jsonify({'message': 'Erro de conexão com o banco de dados'}), 500
+        return jsonify({'message': 'Usuário não encontrado'}), 404
 
 
 # Método POST para adicionar um usuário
@@ -696,26 +1246,43 @@ def add_usuario():
             Genero:
               type: string
               description: Gênero do usuário
+      400:
+        description: CPF ou Email inválido
+        schema:
+          properties:
+            message:
+              type: string
+              description: Mensagem de erro
+      409:
+        description: CPF ou Email já cadastrado
+        schema:
+          properties:
+            message:
+              type: string
+              description: Mensagem de erro
       500:
         description: Erro interno no servidor
         schema:
           properties:
-            message:
+            error:
               type: string
               description: Mensagem de erro
     """
     new_user = request.get_json()
-    connection = connect_to_database()
-    if connection:
-        cursor = connection.cursor()
-        cursor.execute("INSERT INTO Usuario (Nome, CPF, Telefone, Email, Senha, Data_Nascimento, Genero) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING *;",
-                       (new_user['Nome'], new_user['CPF'], new_user['Telefone'], new_user['Email'], new_user['Senha'], new_user['Data_Nascimento'], new_user['Genero']))
-        connection.commit()
-        added_user = cursor.fetchone()
-        connection.close()
-        return jsonify(added_user), 200
-    else:
-        return jsonify({'message': 'Erro de conexão com o banco de dados'}), 500
+    cpf = normalizar_cpf(new_user.get('CPF'))
+    if cpf is None:
+        return jsonify({'message': 'CPF inválido'}), 400
+    email = normalizar_email(new_user.get('Email'))
+    if email is None:
+        return jsonify({'message': 'Email inválido'}), 400
+    try:
+        with transacao() as cursor:
+            cursor.execute("INSERT INTO Usuario (Nome, CPF, Telefone, Email, Senha, Data_Nascimento, Genero) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING *;",
+                           (new_user['Nome'], cpf, new_user['Telefone'], email, new_user['Senha'], new_user['Data_Nascimento'], new_user['Genero']))
+            added_user = cursor.fetchone()
+    except psycopg2.errors.UniqueViolation:
+        return jsonify({'message': 'CPF ou Email já cadastrado'}), 409
+    return jsonify(added_user), 200
 
 # Método PUT para atualizar os dados de um usuário pelo CPF
 @app.route('/usuario/<cpf>', methods=['PUT'])
@@ -784,6 +1351,13 @@ def update_usuario(cpf):
             Genero:
               type: string
               description: Gênero atualizado do usuário
+      400:
+        description: Email inválido
+        schema:
+          properties:
+            message:
+              type: string
+              description: Mensagem de erro
       404:
         description: Usuário não encontrado
         schema:
@@ -795,25 +1369,23 @@ def update_usuario(cpf):
         description: Erro interno no servidor
         schema:
           properties:
-            message:
+            error:
               type: string
               description: Mensagem de erro
     """
     updated_data = request.get_json()
-    connection = connect_to_database()
-    if connection:
-        cursor = connection.cursor()
+    email = normalizar_email(updated_data.get('Email'))
+    if email is None:
+        return jsonify({'message': 'Email inválido'}), 400
+    with transacao() as cursor:
         cursor.execute("UPDATE Usuario SET Nome = %s, Telefone = %s, Email = %s, Senha = %s, Data_Nascimento = %s, Genero = %s WHERE CPF = %s RETURNING *;",
-                       (updated_data['Nome'], updated_data['Telefone'], updated_data['Email'], updated_data['Senha'], updated_data['Data_Nascimento'], updated_data['Genero'], cpf))
-        connection.commit()
+                       (updated_data['Nome'], updated_data['Telefone'], email, updated_data['Senha'], updated_data['Data_Nascimento'], updated_data['Genero'], chave_cpf(cpf)))
         updated_user = cursor.fetchone()
-        connection.close()
-        if updated_user:
-            return jsonify(updated_user), 200
-        else:
-            return jsonify({'message': 'Usuário não encontrado'}), 404
+
+    if updated_user:
+        return jsonify(updated_user), 200
     else:
-        return jsonify({'message': 'Erro de conexão com o banco de dados'}), 500
+        return jsonify({'message': 'Usuário não encontrado'}), 404
 
 # Método DELETE para excluir um usuário pelo CPF
 @app.route('/usuario/<cpf>', methods=['DELETE'])
@@ -868,24 +1440,1475 @@ def delete_usuario(cpf):
         description: Erro interno no servidor
         schema:
           properties:
-            message:
+            error:
               type: string
               description: Mensagem de erro
     """
-    connection = connect_to_database()
-    if connection:
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM Usuario WHERE CPF = %s RETURNING *;", (cpf,))
-        connection.commit()
+    with transacao() as cursor:
+        cursor.execute("DELETE FROM Usuario WHERE CPF = %s RETURNING *;", (chave_cpf(cpf),))
         deleted_user = cursor.fetchone()
-        connection.close()
-        if deleted_user:
-            return jsonify(deleted_user), 200
-        else:
-            return jsonify({'message': 'Usuário não encontrado'}), 404
+
+    if deleted_user:
+        return jsonify(deleted_user), 200
     else:
-        return jsonify({'message': 'Erro de conexão com o banco de dados'}), 500
+        return jsonify({'message': 'Usuário não encontrado'}), 404
     
 
+# Configurações da importação em lote de usuários
+importacao_config = {
+    'tamanho_lote': 1000,   # linhas por INSERT ... ON CONFLICT
+}
+
+_campos_usuario = ['Nome', 'CPF', 'Telefone', 'Email', 'Senha', 'Data_Nascimento', 'Genero']
+_email_valido = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+# Valida os dígitos verificadores e retorna o CPF no formato 000.000.000-00, ou None se for inválido
+def normalizar_cpf(cpf):
+    if isinstance(cpf, int) and not isinstance(cpf, bool):
+        cpf = f"{cpf:011d}"  # CPF numérico perde os zeros à esquerda
+    if not isinstance(cpf, str):
+        return None
+    digitos = re.sub(r'\D', '', cpf)
+    if len(digitos) != 11 or digitos == digitos[0] * 11:
+        return None
+    for n in (9, 10):
+        soma = sum(int(d) * peso for d, peso in zip(digitos[:n], range(n + 1, 1, -1)))
+        if soma * 10 % 11 % 10 != int(digitos[n]):
+            return None
+    return f"{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}"
+
+
+# CPF usado como chave nas consultas e gravações: o formato normalizado, ou o valor recebido se não for um CPF
+# válido (cadastros antigos que não passaram pela validação)
+def chave_cpf(cpf):
+    return normalizar_cpf(cpf) or cpf
+
+
+# Retorna o email sem espaços nas pontas e em minúsculas, ou None se for inválido. Email é UNIQUE e a
+# comparação do banco diferencia maiúsculas, então todo caminho de gravação usa esta forma.
+def normalizar_email(email):
+    if not isinstance(email, str):
+        return None
+    email = email.strip().lower()
+    if len(email) > 100 or not _email_valido.match(email):
+        return None
+    return email
+
+
+# Retorna o telefone no formato (00) 00000-0000, ou None se for inválido
+def normalizar_telefone(telefone):
+    digitos = re.sub(r'\D', '', telefone or '')
+    if len(digitos) in (12, 13) and digitos.startswith('55'):
+        digitos = digitos[2:]
+    if len(digitos) not in (10, 11):
+        return None
+    return f"({digitos[:2]}) {digitos[2:-4]}-{digitos[-4:]}"
+
+
+def _validar_usuario(registro):
+    """Retorna (valores, None) com os campos normalizados na ordem de _campos_usuario, ou (None, erro)."""
+    if not isinstance(registro, dict):
+        return None, 'Registro inválido'
+
+    # No NDJSON os campos podem vir como números; listas, objetos e booleanos são recusados
+    for campo in _campos_usuario:
+        valor = registro.get(campo)
+        if valor is not None and (isinstance(valor, bool) or not isinstance(valor, (str, int, float))):
+            return None, f'{campo} inválido'
+    registro = {
+        campo: valor if isinstance(valor, str) or campo == 'CPF' else str(valor)
+        for campo, valor in registro.items() if campo in _campos_usuario and valor is not None
+    }
+
+    nome = (registro.get('Nome') or '').strip()
+    if not nome or len(nome) > 100:
+        return None, 'Nome inválido'
+
+    cpf = normalizar_cpf(registro.get('CPF'))
+    if cpf is None:
+        return None, 'CPF inválido'
+
+    email = normalizar_email(registro.get('Email'))
+    if email is None:
+        return None, 'Email inválido'
+
+    telefone = None
+    if registro.get('Telefone'):
+        telefone = normalizar_telefone(registro['Telefone'])
+        if telefone is None:
+            return None, 'Telefone inválido'
+
+    nascimento = registro.get('Data_Nascimento') or None
+    if nascimento:
+        try:
+            nascimento = datetime.date.fromisoformat(nascimento)
+        except (TypeError, ValueError):
+            return None, 'Data_Nascimento inválida'
+
+    return (nome, cpf, telefone, email, registro.get('Senha'), nascimento, registro.get('Genero') or None), None
+
+
+def _ler_registros(mimetype, stream):
+    """Gera (linha, registro) a partir de um corpo CSV ou NDJSON sem carregar o arquivo inteiro na memória."""
+    texto = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if mimetype == 'text/csv':
+        for linha, registro in enumerate(csv.DictReader(texto), start=2):
+            yield linha, registro
+        return
+
+    for linha, conteudo in enumerate(texto, start=1):
+        if not conteudo.strip():
+            continue
+        try:
+            yield linha, json.loads(conteudo)
+        except ValueError:
+            yield linha, None
+
+
+_sql_upsert_usuario = """
+    INSERT INTO Usuario (Nome, CPF, Telefone, Email, Senha, Data_Nascimento, Genero)
+    VALUES %s
+    ON CONFLICT (CPF) DO UPDATE
+    SET Nome = EXCLUDED.Nome, Telefone = EXCLUDED.Telefone, Email = EXCLUDED.Email, Senha = EXCLUDED.Senha,
+        Data_Nascimento = EXCLUDED.Data_Nascimento, Genero = EXCLUDED.Genero
+    RETURNING CPF, (xmax = 0) AS inserido;
+"""
+
+
+def _upsert_lote(cursor, lote):
+    """Grava o lote em um único comando; se ele falhar (ex.: Email repetido), grava linha a linha."""
+    cursor.execute("SAVEPOINT lote;")
+    try:
+        gravados = execute_values(
+            cursor, _sql_upsert_usuario, [valores for _, valores in lote],
+            page_size=len(lote), fetch=True
+        )
+        cursor.execute("RELEASE SAVEPOINT lote;")
+        inseridos = dict(gravados)
+        resultados = [
+            {'linha': linha, 'CPF': valores[1], 'status': 'inserido' if inseridos[valores[1]] else 'atualizado'}
+            for linha, valores in lote
+        ]
+    except (psycopg2.IntegrityError, psycopg2.DataError):
+        cursor.execute("ROLLBACK TO SAVEPOINT lote;")
+        resultados = []
+        for linha, valores in lote:
+            cursor.execute("SAVEPOINT linha;")
+            try:
+                ((_, inserido),) = execute_values(cursor, _sql_upsert_usuario, [valores], fetch=True)
+                cursor.execute("RELEASE SAVEPOINT linha;")
+                resultados.append({'linha': linha, 'CPF': valores[1], 'status': 'inserido' if inserido else 'atualizado'})
+            except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT linha;")
+                erro = 'Email já cadastrado' if isinstance(e, psycopg2.errors.UniqueViolation) else e.diag.message_primary
+                resultados.append({'linha': linha, 'CPF': valores[1], 'status': 'erro', 'erro': erro})
+    return resultados
+
+
+# Método POST para importar usuários em lote
+@app.route('/usuario/bulk', methods=['POST'])
+def importar_usuarios():
+    """
+    Importa ou atualiza usuários em lote a partir de CSV ou NDJSON.
+
+    O corpo é lido em streaming. Cada linha tem os mesmos campos do POST /usuario; CPF, Email e Telefone são
+    validados e normalizados, e um CPF já cadastrado tem seus dados atualizados. Os lotes gravados com
+    sucesso são confirmados mesmo que um lote posterior falhe.
+    ---
+    consumes:
+      - text/csv
+      - application/x-ndjson
+    parameters:
+      - name: body
+        in: body
+        required: true
+        description: CSV com cabeçalho (Nome,CPF,Telefone,Email,Senha,Data_Nascimento,Genero) ou um objeto JSON por linha
+        schema:
+          type: string
+      - name: detalhes
+        in: query
+        type: string
+        enum: [todos, erros]
+        required: false
+        description: Retorna o resultado de todas as linhas (padrão) ou apenas das linhas com erro
+
+    responses:
+      200:
+        description: Resultado da importação
+        schema:
+          type: object
+          properties:
+            resumo:
+              type: object
+              properties:
+                total:
+                  type: integer
+                inseridos:
+                  type: integer
+                atualizados:
+                  type: integer
+                erros:
+                  type: integer
+                segundos:
+                  type: number
+            resultados:
+              type: array
+              items:
+                type: object
+                properties:
+                  linha:
+                    type: integer
+                    description: Linha do arquivo
+                  CPF:
+                    type: string
+                    description: CPF normalizado
+                  status:
+                    type: string
+                    description: inserido, atualizado ou erro
+                  erro:
+                    type: string
+                    description: Motivo do erro
+      400:
+        description: Corpo ilegível (não está em UTF-8 ou CSV malformado); as linhas lidas antes do erro são gravadas
+        schema:
+          properties:
+            message:
+              type: string
+              description: Mensagem de erro
+            resumo:
+              type: object
+              description: Resumo das linhas lidas antes do erro
+            resultados:
+              type: array
+              items:
+                type: object
+      415:
+        description: Formato não suportado
+        schema:
+          properties:
+            message:
+              type: string
+              description: Mensagem de erro
+      500:
+        description: Erro interno no servidor
+        schema:
+          properties:
+            message:
+              type: string
+              description: Mensagem de erro
+            resumo:
+              type: object
+              description: Resumo das linhas gravadas antes do erro
+      503:
+        description: Banco de dados sobrecarregado ou indisponível durante a importação (ver Retry-After)
+        schema:
+          properties:
+            message:
+              type: string
+              description: Mensagem de erro
+            resumo:
+              type: object
+              description: Resumo das linhas gravadas antes do erro
+            resultados:
+              type: array
+              items:
+                type: object
+    """
+    formatos = {'text/csv': 'text/csv', 'application/x-ndjson': 'ndjson', 'application/ndjson': 'ndjson'}
+    if request.mimetype not in formatos:
+        return jsonify({'message': 'Formato não suportado, envie text/csv ou application/x-ndjson'}), 415
+
+    inicio = time.perf_counter()
+    somente_erros = request.args.get('detalhes') == 'erros'
+    resumo = {'total': 0, 'inseridos': 0, 'atualizados': 0, 'erros': 0}
+    resultados = []
+
+    def registrar(resultados_lote):
+        for resultado in resultados_lote:
+            resumo['total'] += 1
+            resumo[{'inserido': 'inseridos', 'atualizado': 'atualizados', 'erro': 'erros'}[resultado['status']]] += 1
+            if not somente_erros or resultado['status'] == 'erro':
+                resultados.append(resultado)
+
+    # Cada lote é confirmado na sua própria transação, para um erro no meio não desfazer os anteriores
+    def gravar(lote):
+        with transacao() as cursor:
+            registrar(_upsert_lote(cursor, lote))
+
+    erro_leitura = None
+    try:
+        lote, cpfs_lote = [], set()
+        try:
+            for linha, registro in _ler_registros(formatos[request.mimetype], request.stream):
+                valores, erro = _validar_usuario(registro)
+                if erro:
+                    cpf = registro.get('CPF') if isinstance(registro, dict) else None
+                    registrar([{'linha': linha, 'CPF': cpf, 'status': 'erro', 'erro': erro}])
+                    continue
+
+                # Um mesmo CPF não pode aparecer duas vezes no mesmo INSERT ... ON CONFLICT
+                if valores[1] in cpfs_lote or len(lote) >= importacao_config['tamanho_lote']:
+                    gravar(lote)
+                    lote, cpfs_lote = [], set()
+                lote.append((linha, valores))
+                cpfs_lote.add(valores[1])
+        except (UnicodeDecodeError, csv.Error) as e:
+            # As linhas lidas antes do erro ainda são gravadas; o restante do corpo é ignorado
+            erro_leitura = 'Corpo não está em UTF-8' if isinstance(e, UnicodeDecodeError) else f'CSV inválido: {e}'
+
+        if lote:
+            gravar(lote)
+
+    except ErroConexao:
+        return jsonify({'message': 'Erro de conexão com o banco de dados', 'resumo': resumo}), 500
+
+    # Banco sobrecarregado ou fora do ar no meio da importação: os lotes anteriores já foram confirmados
+    except ServicoIndisponivel as e:
+        corpo = {'message': e.mensagem, 'resumo': resumo, 'resultados': resultados}
+        return jsonify(corpo), 503, {'Retry-After': str(e.retry_after)}
+
+    except psycopg2.Error as e:
+        print(f"Erro ao importar usuários: {e}")
+        return jsonify({'message': 'Erro interno no servidor', 'resumo': resumo}), 500
+
+    resumo['segundos'] = round(time.perf_counter() - inicio, 3)
+    if erro_leitura:
+        return jsonify({'message': erro_leitura, 'resumo': resumo, 'resultados': resultados}), 400
+    return jsonify({'resumo': resumo, 'resultados': resultados}), 200
+
+
+#---------------------------------------PARTICIONAMENTO E ARQUIVAMENTO---------------------------------------------
+
+'''
+A tabela Agendamento é particionada por mês em Data_Agendamento (partições agendamento_AAAA_MM) e tem uma
+partição padrão (agendamento_padrao) para datas sem partição própria. Um job cria as partições dos próximos
+meses, movendo para elas as linhas que estiverem na partição padrão. O job não é iniciado pelas requisições:
+ele roda no processo iniciado por `python app.py` ou em um processo próprio com `flask particoes job`. Partições mais antigas que
+meses_quentes podem ser arquivadas: o conteúdo vai para um arquivo CSV compactado (AAAA_MM.csv.gz) e a
+partição é removida do banco. Os meses arquivados continuam disponíveis em GET /agendamentos/arquivo.
+'''
+
+# Configurações do particionamento
+particao_config = {
+    'meses_a_frente': 3,            # partições criadas com antecedência
+    'intervalo_criacao': 6 * 3600,  # segundos entre execuções automáticas do job de criação
+    'meses_quentes': 24,            # meses mantidos no banco; os anteriores podem ser arquivados
+    'espera_lock_arquivo': 30000,   # ms aguardando o lock da tabela Agendamento ao arquivar uma partição
+    'diretorio_arquivo': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'arquivo'),
+}
+
+_job_particoes = None
+_job_particoes_lock = threading.Lock()
+
+
+def _somar_meses(data, meses):
+    total = data.year * 12 + data.month - 1 + meses
+    return datetime.date(total // 12, total % 12 + 1, 1)
+
+
+def _nome_particao(mes):
+    return f"agendamento_{mes:%Y_%m}"
+
+
+# Cria as partições mensais de primeiro_mes até ultimo_mes (inclusive) que ainda não existem
+def criar_particoes(cursor, primeiro_mes, ultimo_mes):
+    # Serializa o job entre processos; o lock é liberado no fim da transação
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('particoes_agendamento'));")
+
+    criadas = []
+    mes = primeiro_mes.replace(day=1)
+    while mes <= ultimo_mes:
+        nome = _nome_particao(mes)
+        proximo = _somar_meses(mes, 1)
+        cursor.execute("SELECT to_regclass(%s);", (nome,))
+        if cursor.fetchone()[0] is None:
+            cursor.execute(
+                sql.SQL("CREATE TABLE {} (LIKE Agendamento INCLUDING DEFAULTS INCLUDING CONSTRAINTS);")
+                .format(sql.Identifier(nome))
+            )
+            # Linhas do mês que caíram na partição padrão precisam sair dela antes do ATTACH. A mudança de
+            # partição não altera nenhum agendamento, então o trigger de notificação fica desligado no DELETE
+            cursor.execute("ALTER TABLE agendamento_padrao DISABLE TRIGGER agendamento_notificar;")
+            cursor.execute(
+                sql.SQL(
+                    """
+                    WITH movidos AS (
+                        DELETE FROM agendamento_padrao
+                        WHERE Data_Agendamento >= %s AND Data_Agendamento < %s
+                        RETURNING *
+                    )
+                    INSERT INTO {} SELECT * FROM movidos;
+                    """
+                ).format(sql.Identifier(nome)),
+                (mes, proximo)
+            )
+            cursor.execute("ALTER TABLE agendamento_padrao ENABLE TRIGGER agendamento_notificar;")
+            cursor.execute(
+                sql.SQL("ALTER TABLE Agendamento ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s);")
+                .format(sql.Identifier(nome)),
+                (mes, proximo)
+            )
+            criadas.append(nome)
+        mes = proximo
+    return criadas
+
+
+def _executar_job_particoes():
+    with transacao() as cursor:
+        cursor.execute("SET LOCAL statement_timeout = 0;")
+        hoje = datetime.date.today()
+        criadas = criar_particoes(cursor, hoje, _somar_meses(hoje, particao_config['meses_a_frente']))
+    for nome in criadas:
+        print(f"Partição {nome} criada")
+    return criadas
+
+
+def _job_criar_particoes():
+    while True:
+        try:
+            _executar_job_particoes()
+        except (psycopg2.Error, ServicoIndisponivel, ErroConexao) as e:
+            print(f"Erro ao criar partições de agendamentos: {e}")
+        time.sleep(particao_config['intervalo_criacao'])
+
+
+# Inicia o job em uma thread do processo atual (ver __main__)
+def iniciar_job_particoes():
+    global _job_particoes
+    if _job_particoes is not None:
+        return
+    with _job_particoes_lock:
+        if _job_particoes is None:
+            _job_particoes = threading.Thread(target=_job_criar_particoes, name='job-particoes', daemon=True)
+            _job_particoes.start()
+
+
+# Arquiva as partições anteriores ao mês limite e retorna os meses arquivados
+def arquivar_particoes(limite):
+    os.makedirs(particao_config['diretorio_arquivo'], exist_ok=True)
+
+    with transacao(somente_leitura=True) as cursor:
+        cursor.execute(
+            r"""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'agendamento'::regclass AND c.relname ~ '^agendamento_\d{4}_\d{2}$'
+            ORDER BY c.relname;
+            """
+        )
+        particoes = [linha[0] for linha in cursor.fetchall()]
+
+    arquivados = []
+    for nome in particoes:
+        mes = datetime.datetime.strptime(nome, 'agendamento_%Y_%m').date()
+        if mes >= limite:
+            continue
+
+        destino = os.path.join(particao_config['diretorio_arquivo'], f"{mes:%Y_%m}.csv.gz")
+        temporario = destino + '.tmp'
+        if os.path.exists(destino):
+            print(f"Arquivo {destino} já existe, partição {nome} mantida no banco")
+            continue
+        # Uma transação por partição. O arquivo só é publicado depois do DROP e é removido se o commit falhar,
+        # então um mês nunca fica ao mesmo tempo no arquivo e no banco
+        publicado = False
+        try:
+            with transacao() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = 0;")
+                cursor.execute("SET LOCAL lock_timeout = %s;", (particao_config['espera_lock_arquivo'],))
+                # O DROP precisa de ACCESS EXCLUSIVE na tabela-mãe; pedir esse lock antes de ler a partição
+                # segue a ordem das escritas (mãe, depois partição) e evita deadlock. As consultas a
+                # Agendamento esperam até o fim do arquivamento desta partição.
+                cursor.execute("LOCK TABLE Agendamento IN ACCESS EXCLUSIVE MODE;")
+                with gzip.open(temporario, 'wb') as arquivo:
+                    cursor.copy_expert(
+                        sql.SQL(
+                            "COPY (SELECT * FROM {} ORDER BY Data_Agendamento, Hora_Agendamento) TO STDOUT WITH CSV HEADER"
+                        ).format(sql.Identifier(nome)),
+                        arquivo
+                    )
+                cursor.execute(sql.SQL("DROP TABLE {};").format(sql.Identifier(nome)))
+                # os.link não sobrescreve um arquivo criado entretanto; se falhar, o DROP é desfeito
+                os.link(temporario, destino)
+                publicado = True
+        except BaseException:
+            if publicado:
+                os.remove(destino)
+            raise
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+        print(f"Partição {nome} arquivada em {destino}")
+        arquivados.append(f"{mes:%Y-%m}")
+    return arquivados
+
+
+particoes_cli = AppGroup('particoes', help='Manutenção das partições da tabela Agendamento.')
+
+
+# flask --app app particoes criar --de 2022-01 --ate 2025-12
+@particoes_cli.command('criar')
+@click.option('--de', 'primeiro', help='Primeiro mês (AAAA-MM). Padrão: mês atual.')
+@click.option('--ate', 'ultimo', help='Último mês (AAAA-MM). Padrão: meses_a_frente após o atual.')
+def particoes_criar(primeiro, ultimo):
+    """Cria as partições mensais que ainda não existem."""
+    hoje = datetime.date.today()
+    primeiro = datetime.datetime.strptime(primeiro, '%Y-%m').date() if primeiro else hoje
+    ultimo = datetime.datetime.strptime(ultimo, '%Y-%m').date() if ultimo else _somar_meses(hoje, particao_config['meses_a_frente'])
+
+    with transacao() as cursor:
+        cursor.execute("SET LOCAL statement_timeout = 0;")
+        criadas = criar_particoes(cursor, primeiro, ultimo)
+    print(f"{len(criadas)} partições criadas: {', '.join(criadas) or '-'}")
+
+
+# flask --app app particoes arquivar --meses-quentes 24
+@particoes_cli.command('arquivar')
+@click.option('--meses-quentes', type=int, default=None, help='Meses mantidos no banco (padrão: particao_config).')
+def particoes_arquivar(meses_quentes):
+    """Move as partições antigas para arquivos CSV compactados."""
+    if meses_quentes is None:
+        meses_quentes = particao_config['meses_quentes']
+    limite = _somar_meses(datetime.date.today(), -meses_quentes)
+
+    try:
+        arquivados = arquivar_particoes(limite)
+    except (ErroConexao, psycopg2.Error) as e:
+        raise click.ClickException(f"Erro ao arquivar partições: {e}")
+    except ServicoIndisponivel as e:
+        raise click.ClickException(e.mensagem)
+    except FileExistsError as e:
+        raise click.ClickException(f"Arquivo {e.filename2} criado durante o arquivamento, partição mantida no banco")
+    print(f"{len(arquivados)} meses arquivados: {', '.join(arquivados) or '-'}")
+
+
+# flask --app app particoes job (processo próprio, ex.: um serviço ao lado dos workers do gunicorn)
+@particoes_cli.command('job')
+def particoes_job():
+    """Executa o job de criação de partições a cada intervalo_criacao segundos."""
+    _job_criar_particoes()
+
+
+app.cli.add_command(particoes_cli)
+
+
+# Rota para listar os meses de agendamentos arquivados
+@app.route('/agendamentos/arquivo', methods=['GET'])
+def listar_arquivo_agendamentos():
+    """
+    Lista os meses de agendamentos arquivados.
+
+    ---
+    responses:
+      200:
+        description: Meses arquivados (YYYY-MM)
+        schema:
+          type: array
+          items:
+            type: string
+    """
+    diretorio = particao_config['diretorio_arquivo']
+    meses = []
+    if os.path.isdir(diretorio):
+        for nome in sorted(os.listdir(diretorio)):
+            if nome.endswith('.csv.gz'):
+                meses.append(nome[:-len('.csv.gz')].replace('_', '-'))
+    return jsonify(meses), 200
+
+
+# Rota para consultar os agendamentos arquivados de um mês
+@app.route('/agendamentos/arquivo/<mes>', methods=['GET'])
+def consultar_arquivo_agendamentos(mes):
+    """
+    Consulta os agendamentos arquivados de um mês.
+
+    ---
+    parameters:
+      - name: mes
+        in: path
+        type: string
+        required: true
+        description: Mês arquivado (YYYY-MM)
+      - name: cpf
+        in: query
+        type: string
+        required: false
+        description: Retorna apenas os agendamentos deste CPF
+
+    responses:
+      200:
+        description: Lista de agendamentos arquivados
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              Id_Agendamento:
+                type: integer
+                description: ID do agendamento
+              CPF:
+                type: string
+                description: CPF do usuário
+              Hora_Agendamento:
+                type: string
+                description: Hora do agendamento (HH:MM)
+              Data_Agendamento:
+                type: string
+                description: Data do agendamento (YYYY-MM-DD)
+              Valor:
+                type: number
+                format: float
+                description: Valor do agendamento
+              Servico:
+                type: string
+                description: Tipo de serviço do agendamento
+      400:
+        description: Mês inválido
+        schema:
+          properties:
+            error:
+              type: string
+              description: Mensagem de erro
+      404:
+        description: Mês não arquivado
+        schema:
+          properties:
+            error:
+              type: string
+              description: Mensagem de erro
+    """
+    try:
+        mes = datetime.datetime.strptime(mes, '%Y-%m').date()
+    except ValueError:
+        return jsonify({'error': 'Mês inválido, use YYYY-MM'}), 400
+
+    caminho = os.path.join(particao_config['diretorio_arquivo'], f"{mes:%Y_%m}.csv.gz")
+    if not os.path.exists(caminho):
+        return jsonify({'error': 'Mês não arquivado'}), 404
+
+    cpf = chave_cpf(request.args.get('cpf'))
+    agendamentos_list = []
+    with gzip.open(caminho, 'rt', encoding='utf-8', newline='') as arquivo:
+        leitor = csv.reader(arquivo)
+        next(leitor, None)  # cabeçalho
+        for agendamento in leitor:
+            if cpf and chave_cpf(agendamento[1]) != cpf:
+                continue
+            agendamentos_list.append({
+                'Id_Agendamento': int(agendamento[0]),
+                'CPF': agendamento[1],
+                'Hora_Agendamento': agendamento[2],
+                'Data_Agendamento': agendamento[3],
+                'Valor': float(agendamento[4]) if agendamento[4] else None,
+                'Servico': agendamento[5]
+            })
+
+    return jsonify(agendamentos_list), 200
+
+
+#---------------------------------------ATUALIZAÇÕES EM TEMPO REAL (SSE)---------------------------------------------
+
+'''
+FUNCTION notificar_agendamento() RETURNS trigger AS $$
+DECLARE
+  registro Agendamento%ROWTYPE;
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    registro := OLD;
+  ELSE
+    registro := NEW;
+  END IF;
+  PERFORM pg_notify('agendamentos', json_build_object(
+    'operacao', TG_OP,
+    'Id_Agendamento', registro.Id_Agendamento,
+    'CPF', registro.CPF,
+    'Hora_Agendamento', registro.Hora_Agendamento,
+    'Data_Agendamento', registro.Data_Agendamento,
+    'Data_Anterior', CASE WHEN TG_OP = 'UPDATE' THEN OLD.Data_Agendamento END,
+    'Valor', registro.Valor,
+    'Servico', registro.Servico
+  )::text);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+TRIGGER agendamento_notificar AFTER INSERT OR UPDATE OR DELETE ON Agendamento
+  FOR EACH ROW EXECUTE FUNCTION notificar_agendamento();
+'''
+
+'''
+Cada processo mantém uma única conexão com LISTEN no canal do gatilho acima e repassa as notificações para
+as filas dos clientes conectados em GET /agendamentos/stream. Cada cliente conectado ocupa uma thread do
+servidor enquanto o stream estiver aberto, então use workers com threads (ou gevent) para muitas telas.
+'''
+
+# Configurações do stream de agendamentos
+stream_config = {
+    'canal': 'agendamentos',
+    'heartbeat': 15,                # segundos entre comentários de keep-alive enviados aos clientes
+    'tamanho_fila_assinante': 100,  # eventos guardados por cliente lento antes de pedir ressincronização
+    'espera_reconexao': 5,          # segundos antes de reconectar o listener após uma falha
+}
+
+
+class Assinante:
+    """Cliente conectado ao stream, com filtro opcional pela data do agendamento."""
+
+    def __init__(self, data=None):
+        self.data = data
+        self.fila = queue.Queue(maxsize=stream_config['tamanho_fila_assinante'])
+
+    def enviar(self, evento):
+        try:
+            self.fila.put_nowait(evento)
+        except queue.Full:
+            # Cliente lento: descarta o que estava pendente e pede para ele recarregar a agenda
+            with self.fila.mutex:
+                self.fila.queue.clear()
+            self.fila.put_nowait(None)
+
+
+_assinantes = set()
+_assinantes_lock = threading.Lock()
+_ouvinte = None
+
+
+def _distribuir(payload):
+    evento = json.loads(payload)
+    datas = {evento.get('Data_Agendamento'), evento.get('Data_Anterior')}
+    with _assinantes_lock:
+        assinantes = list(_assinantes)
+    for assinante in assinantes:
+        if assinante.data is None or assinante.data in datas:
+            assinante.enviar(payload)
+
+
+def _pedir_ressincronizacao():
+    with _assinantes_lock:
+        assinantes = list(_assinantes)
+    for assinante in assinantes:
+        assinante.enviar(None)
+
+
+def _ouvir_agendamentos():
+    # As notificações só existem no primário, por isso o listener não usa as réplicas nem o pool
+    reconectando = False
+    while True:
+        connection = None
+        try:
+            connection = psycopg2.connect(**db_config)
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(sql.SQL("LISTEN {};").format(sql.Identifier(stream_config['canal'])))
+            print(f"Ouvindo notificações do canal {stream_config['canal']}")
+
+            # Eventos podem ter sido perdidos enquanto o listener estava desconectado
+            if reconectando:
+                _pedir_ressincronizacao()
+            reconectando = True
+
+            while True:
+                if select.select([connection], [], [], stream_config['heartbeat']) == ([], [], []):
+                    # Nenhuma notificação: confirma que a conexão continua viva
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT 1;")
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    _distribuir(connection.notifies.pop(0).payload)
+
+        except (psycopg2.Error, OSError, ValueError) as e:
+            print(f"Erro no listener de agendamentos: {e}")
+
+        finally:
+            if connection is not None:
+                connection.close()
+
+        time.sleep(stream_config['espera_reconexao'])
+
+
+def _iniciar_ouvinte():
+    global _ouvinte
+    with _assinantes_lock:
+        if _ouvinte is None:
+            _ouvinte = threading.Thread(target=_ouvir_agendamentos, name='listener-agendamentos', daemon=True)
+            _ouvinte.start()
+
+
+# Rota para acompanhar novos agendamentos em tempo real (server-sent events)
+@app.route('/agendamentos/stream', methods=['GET'])
+def stream_agendamentos():
+    """
+    Envia as alterações de agendamentos em tempo real (server-sent events).
+
+    Cada alteração chega como um evento "agendamento" com o registro em JSON e o campo "operacao"
+    (INSERT, UPDATE ou DELETE). Um evento "resync" indica que eventos foram perdidos e a agenda
+    deve ser consultada novamente em GET /agendamentos.
+    ---
+    produces:
+      - text/event-stream
+    parameters:
+      - name: data
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Recebe apenas agendamentos desta data (YYYY-MM-DD)
+
+    responses:
+      200:
+        description: Stream de eventos de agendamentos
+      400:
+        description: Data inválida
+        schema:
+          properties:
+            error:
+              type: string
+              description: Mensagem de erro
+    """
+    data = request.args.get('data')
+    if data:
+        try:
+            data = datetime.date.fromisoformat(data).isoformat()
+        except ValueError:
+            return jsonify({'error': 'Data inválida, use YYYY-MM-DD'}), 400
+
+    _iniciar_ouvinte()
+    assinante = Assinante(data)
+    with _assinantes_lock:
+        _assinantes.add(assinante)
+
+    def eventos():
+        try:
+            yield f"retry: {stream_config['espera_reconexao'] * 1000}\n\n"
+            while True:
+                try:
+                    evento = assinante.fila.get(timeout=stream_config['heartbeat'])
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if evento is None:
+                    yield "event: resync\ndata: {}\n\n"
+                else:
+                    yield f"event: agendamento\ndata: {evento}\n\n"
+        finally:
+            with _assinantes_lock:
+                _assinantes.discard(assinante)
+
+    return Response(
+        eventos(), mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+#---------------------------------------TAREFAS ASSÍNCRONAS (OUTBOX)---------------------------------------------
+
+'''
+TABLE Outbox (
+  Id_Outbox BIGSERIAL PRIMARY KEY,
+  Tipo VARCHAR(50) NOT NULL,
+  Carga JSONB NOT NULL,
+  Criado_Em TIMESTAMPTZ NOT NULL DEFAULT now(),
+  Processado_Em TIMESTAMPTZ,
+  Tentativas INTEGER NOT NULL DEFAULT 0,
+  Proxima_Tentativa TIMESTAMPTZ NOT NULL DEFAULT now(),
+  Erro TEXT
+);
+
+TABLE Auditoria (
+  Id_Auditoria BIGSERIAL PRIMARY KEY,
+  Tabela VARCHAR(50),
+  Operacao VARCHAR(10),
+  Registro VARCHAR(50),
+  Dados JSONB,
+  Criado_Em TIMESTAMPTZ DEFAULT now()
+);
+
+TABLE Relatorio_Diario (
+  Data DATE,
+  Servico VARCHAR(100),
+  Quantidade INTEGER,
+  Valor_Total DECIMAL(12, 2),
+  PRIMARY KEY (Data, Servico)
+);
+'''
+
+'''
+Efeitos colaterais que não precisam acontecer antes da resposta (confirmação, auditoria, relatório) são
+gravados na tabela Outbox na mesma transação do registro que os originou. Alterações e exclusões de
+agendamentos também geram auditoria e o ajuste do relatório, que subtrai os dados anteriores. Depois do commit, os ids vão para
+uma fila processada por threads em segundo plano. Se o processo cair antes disso, a varredura periódica
+encontra as tarefas pendentes no banco e as processa novamente.
+'''
+
+# Configurações da fila de tarefas
+fila_config = {
+    'workers': 2,               # threads processando a fila
+    'max_tentativas': 5,        # tentativas antes de a tarefa ficar parada com o erro registrado
+    'espera_base': 2,           # segundos de espera antes da 1ª nova tentativa (dobra a cada falha)
+    'intervalo_varredura': 15,  # segundos entre buscas por tarefas pendentes na tabela Outbox
+}
+
+
+class FilaMemoria:
+    """Fila em memória do processo. Pode ser trocada por outra implementação com os mesmos métodos."""
+
+    def __init__(self):
+        self._fila = queue.Queue()
+
+    def enfileirar(self, id_outbox):
+        self._fila.put((id_outbox, time.monotonic()))
+
+    def retirar(self, timeout):
+        """Retorna (id_outbox, enfileirado_em) ou None se nada chegar dentro do timeout."""
+        try:
+            return self._fila.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def tamanho(self):
+        return self._fila.qsize()
+
+
+fila = FilaMemoria()
+fila_metricas = {'processadas': 0, 'falhas': 0, 'atraso_ultima': 0.0}
+_fila_lock = threading.Lock()
+_varredura_lock = threading.Lock()
+_workers = []
+_ultima_varredura = 0.0
+
+
+# Notificador padrão: nenhum canal de envio configurado, a confirmação só é registrada no log
+def confirmacao_nao_enviada(carga):
+    print(f"Nenhum notificador configurado, confirmação do agendamento {carga['Id_Agendamento']} não enviada")
+
+
+# Função que envia a confirmação (e-mail, SMS...) a partir da carga da tarefa. Uma exceção faz a tarefa ser
+# tentada novamente, então o envio pode se repetir e o notificador deve tolerar duplicatas.
+notificar_confirmacao = confirmacao_nao_enviada
+
+
+def _enviar_confirmacao(cursor, carga):
+    notificar_confirmacao(carga)
+
+
+def _registrar_auditoria(cursor, carga):
+    cursor.execute(
+        """
+        INSERT INTO Auditoria (Tabela, Operacao, Registro, Dados)
+        VALUES ('Agendamento', %s, %s, %s);
+        """,
+        (carga.get('Operacao', 'INSERT'), str(carga['Id_Agendamento']), Json(carga))
+    )
+
+
+# INSERT soma o agendamento ao resumo do seu dia e DELETE o subtrai; UPDATE subtrai os dados anteriores
+# (carga['Anterior']) e soma os novos
+def _atualizar_relatorio(cursor, carga):
+    operacao = carga.get('Operacao', 'INSERT')
+    ajustes = [(carga['Anterior'], -1)] if operacao == 'UPDATE' else []
+    ajustes.append((carga, -1 if operacao == 'DELETE' else 1))
+
+    for dados, sinal in ajustes:
+        cursor.execute(
+            """
+            INSERT INTO Relatorio_Diario (Data, Servico, Quantidade, Valor_Total)
+            VALUES (%s, %s, %s, %s * COALESCE(%s::numeric, 0))
+            ON CONFLICT (Data, Servico) DO UPDATE
+            SET Quantidade = Relatorio_Diario.Quantidade + EXCLUDED.Quantidade,
+                Valor_Total = Relatorio_Diario.Valor_Total + EXCLUDED.Valor_Total;
+            """,
+            (dados['Data_Agendamento'], dados['Servico'], sinal, sinal, dados['Valor'])
+        )
+
+
+# Manipuladores por tipo de tarefa. Recebem o cursor da transação que marca a tarefa como processada,
+# então o que for gravado no banco acontece exatamente uma vez.
+manipuladores_outbox = {
+    'confirmacao': _enviar_confirmacao,
+    'auditoria': _registrar_auditoria,
+    'relatorio': _atualizar_relatorio,
+}
+
+
+# Carga da Outbox a partir de uma linha de SELECT * FROM Agendamento
+def carga_agendamento(linha):
+    id_agendamento, cpf, hora, data, valor, servico = linha
+    return {
+        'Id_Agendamento': id_agendamento,
+        'CPF': cpf,
+        'Hora_Agendamento': hora.isoformat() if hora is not None else None,
+        'Data_Agendamento': data.isoformat(),
+        'Valor': str(valor) if valor is not None else None,
+        'Servico': servico,
+    }
+
+
+# Grava as tarefas na Outbox usando o cursor da transação atual e retorna os ids para enfileirar após o commit
+def registrar_outbox(cursor, tipos, carga):
+    cursor.execute(
+        """
+        INSERT INTO Outbox (Tipo, Carga)
+        SELECT tipo, %s FROM unnest(%s::varchar[]) AS tipo
+        RETURNING Id_Outbox;
+        """,
+        (Json(carga), tipos)
+    )
+    return [linha[0] for linha in cursor.fetchall()]
+
+
+def _processar_outbox(id_outbox):
+    try:
+        with transacao() as cursor:
+            cursor.execute(
+                """
+                SELECT Tipo, Carga, Tentativas FROM Outbox
+                WHERE Id_Outbox = %s AND Processado_Em IS NULL
+                FOR UPDATE SKIP LOCKED;
+                """,
+                (id_outbox,)
+            )
+            tarefa = cursor.fetchone()
+            if tarefa is None:
+                return
+
+            tipo, carga, tentativas = tarefa
+            cursor.execute("SAVEPOINT tarefa;")
+            try:
+                manipuladores_outbox[tipo](cursor, carga)
+                cursor.execute(
+                    "UPDATE Outbox SET Processado_Em = now(), Tentativas = Tentativas + 1, Erro = NULL WHERE Id_Outbox = %s;",
+                    (id_outbox,)
+                )
+                sucesso = True
+            except Exception as e:
+                print(f"Erro ao processar tarefa {id_outbox} ({tipo}): {e}")
+                cursor.execute("ROLLBACK TO SAVEPOINT tarefa;")
+                cursor.execute(
+                    """
+                    UPDATE Outbox
+                    SET Tentativas = Tentativas + 1, Erro = %s,
+                        Proxima_Tentativa = now() + make_interval(secs => %s)
+                    WHERE Id_Outbox = %s;
+                    """,
+                    (str(e), fila_config['espera_base'] * 2 ** tentativas, id_outbox)
+                )
+                sucesso = False
+
+        with _fila_lock:
+            fila_metricas['processadas' if sucesso else 'falhas'] += 1
+
+    except (psycopg2.Error, ErroConexao) as e:
+        print(f"Erro ao processar tarefa {id_outbox}: {e}")
+
+
+def _varrer_outbox():
+    global _ultima_varredura
+    if time.monotonic() - _ultima_varredura < fila_config['intervalo_varredura']:
+        return
+    if not _varredura_lock.acquire(blocking=False):
+        return
+
+    try:
+        _ultima_varredura = time.monotonic()
+        with transacao(somente_leitura=True) as cursor:
+            cursor.execute(
+                """
+                SELECT Id_Outbox FROM Outbox
+                WHERE Processado_Em IS NULL AND Tentativas < %s AND Proxima_Tentativa <= now()
+                  AND Criado_Em < now() - make_interval(secs => %s)
+                ORDER BY Id_Outbox
+                LIMIT 1000;
+                """,
+                (fila_config['max_tentativas'], fila_config['intervalo_varredura'])
+            )
+            pendentes = cursor.fetchall()
+
+        for (id_outbox,) in pendentes:
+            fila.enfileirar(id_outbox)
+
+    except (psycopg2.Error, ServicoIndisponivel, ErroConexao) as e:
+        print(f"Erro ao buscar tarefas pendentes: {e}")
+
+    finally:
+        _varredura_lock.release()
+
+
+def _worker_outbox():
+    while True:
+        item = fila.retirar(timeout=fila_config['intervalo_varredura'])
+        if item is not None:
+            id_outbox, enfileirado_em = item
+            with _fila_lock:
+                fila_metricas['atraso_ultima'] = time.monotonic() - enfileirado_em
+            try:
+                _processar_outbox(id_outbox)
+            except ServicoIndisponivel as e:
+                print(f"Tarefa {id_outbox} adiada: {e}")
+        _varrer_outbox()
+
+
+# Os workers são iniciados na primeira requisição, e não na importação do módulo (ex.: comandos flask)
+@app.before_request
+def iniciar_workers_outbox():
+    if _workers:
+        return
+    with _fila_lock:
+        if _workers:
+            return
+        for i in range(fila_config['workers']):
+            worker = threading.Thread(target=_worker_outbox, name=f'outbox-{i + 1}', daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+# Rota com as métricas internas da aplicação
+@app.route('/metricas', methods=['GET'])
+def metricas():
+    """
+    Consulta as métricas da fila de tarefas assíncronas e das conexões com o banco.
+
+    ---
+    responses:
+      200:
+        description: Métricas da aplicação
+        schema:
+          type: object
+          properties:
+            fila:
+              type: object
+              properties:
+                profundidade:
+                  type: integer
+                  description: Tarefas aguardando na fila em memória
+                processadas:
+                  type: integer
+                  description: Tarefas processadas com sucesso por este processo
+                falhas:
+                  type: integer
+                  description: Tentativas que falharam neste processo
+                atraso_ultima:
+                  type: number
+                  description: Segundos que a última tarefa esperou na fila
+                pendentes:
+                  type: integer
+                  description: Tarefas ainda não processadas na tabela Outbox que ainda serão tentadas
+                atraso_pendentes:
+                  type: number
+                  description: Idade em segundos da tarefa pendente mais antiga
+                mortas:
+                  type: integer
+                  description: Tarefas que esgotaram max_tentativas e não serão mais tentadas (ver coluna Erro)
+            conexoes:
+              type: object
+              properties:
+                em_uso:
+                  type: integer
+                  description: Conexões fora do pool neste processo
+                vazadas:
+                  type: integer
+                  description: Conexões que as rotas não devolveram e foram recuperadas no fim da requisição
+                presas:
+                  type: array
+                  description: Conexões fora do pool há mais de 30 segundos
+                  items:
+                    type: object
+                    properties:
+                      dono:
+                        type: string
+                        description: Rota ou thread que pegou a conexão
+                      segundos:
+                        type: number
+                        description: Tempo fora do pool
+    """
+    with _fila_lock:
+        dados_fila = dict(fila_metricas, profundidade=fila.tamanho())
+
+    # As métricas em memória continuam disponíveis mesmo com o banco fora do ar
+    try:
+        with transacao(somente_leitura=True) as cursor:
+            # Tarefas mortas ficam fora do atraso, senão uma única delas faria a métrica crescer para sempre
+            cursor.execute(
+                """
+                SELECT count(*) FILTER (WHERE Tentativas < %(max)s),
+                       COALESCE(EXTRACT(EPOCH FROM now() - min(Criado_Em) FILTER (WHERE Tentativas < %(max)s)), 0),
+                       count(*) FILTER (WHERE Tentativas >= %(max)s)
+                FROM Outbox WHERE Processado_Em IS NULL;
+                """,
+                {'max': fila_config['max_tentativas']}
+            )
+            pendentes, atraso, mortas = cursor.fetchone()
+        dados_fila['pendentes'] = pendentes
+        dados_fila['atraso_pendentes'] = float(atraso)
+        dados_fila['mortas'] = mortas
+    except (psycopg2.Error, ServicoIndisponivel, ErroConexao) as e:
+        print(f"Erro ao consultar tarefas pendentes: {e}")
+
+    return jsonify({'fila': dados_fila, 'conexoes': conexoes_em_uso()}), 200
+
+
+#---------------------------------------MIGRAÇÕES E DADOS DE TESTE---------------------------------------------
+
+'''
+As migrações ficam em migrations/ como arquivos NNNN_descricao.sql e são aplicadas em ordem, cada uma em sua
+própria transação, pelo comando `flask --app app db migrar`. As versões aplicadas ficam na tabela
+schema_migrations. Em um banco criado antes das migrações, as tabelas da 0001 já existem: marque-a como
+aplicada com `flask --app app db marcar 0001_usuario_agendamento` antes do `db migrar`, e a 0005 converte a
+tabela Agendamento existente para o formato particionado. O comando `flask --app app db gerar-dados` carrega com COPY um conjunto de dados
+determinístico (mesma semente e mesmo período geram os mesmos registros) para testes de desempenho.
+'''
+
+diretorio_migracoes = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+db_cli = AppGroup('db', help='Migrações do banco de dados e dados de teste.')
+
+
+def _migracoes():
+    return sorted(nome for nome in os.listdir(diretorio_migracoes) if re.match(r'^\d{4}_.+\.sql$', nome))
+
+
+def _migracoes_aplicadas(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+          Versao VARCHAR(100) PRIMARY KEY,
+          Aplicada_Em TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """
+    )
+    cursor.execute("SELECT Versao FROM schema_migrations;")
+    return {linha[0] for linha in cursor.fetchall()}
+
+
+# flask --app app db migrar
+@db_cli.command('migrar')
+def db_migrar():
+    """Aplica as migrações pendentes."""
+    with transacao() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'));")
+        aplicadas = _migracoes_aplicadas(cursor)
+        pendentes = [nome for nome in _migracoes() if nome[:-len('.sql')] not in aplicadas]
+
+    for nome in pendentes:
+        with open(os.path.join(diretorio_migracoes, nome), encoding='utf-8') as arquivo:
+            comandos = arquivo.read()
+        with transacao() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = 0;")
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'));")
+            if nome[:-len('.sql')] in _migracoes_aplicadas(cursor):
+                continue
+            cursor.execute(comandos)
+            cursor.execute("INSERT INTO schema_migrations (Versao) VALUES (%s);", (nome[:-len('.sql')],))
+        print(f"Migração {nome} aplicada")
+
+    print(f"{len(pendentes)} migrações aplicadas")
+
+
+# flask --app app db marcar 0001_usuario_agendamento
+@db_cli.command('marcar')
+@click.argument('versao')
+def db_marcar(versao):
+    """Registra uma migração como aplicada sem executá-la."""
+    if f"{versao}.sql" not in _migracoes():
+        raise click.ClickException(f"Migração {versao} não encontrada em {diretorio_migracoes}")
+    with transacao() as cursor:
+        _migracoes_aplicadas(cursor)
+        cursor.execute("INSERT INTO schema_migrations (Versao) VALUES (%s) ON CONFLICT DO NOTHING;", (versao,))
+    print(f"Migração {versao} marcada como aplicada")
+
+
+# flask --app app db status
+@db_cli.command('status')
+def db_status():
+    """Lista as migrações aplicadas e pendentes."""
+    with transacao() as cursor:
+        aplicadas = _migracoes_aplicadas(cursor)
+    for nome in _migracoes():
+        print(f"{'aplicada' if nome[:-len('.sql')] in aplicadas else 'pendente':<10}{nome}")
+
+
+_nomes = ['Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João',
+          'Karina', 'Lucas', 'Mariana', 'Nicolas', 'Olívia', 'Pedro', 'Rafaela', 'Samuel', 'Tatiane', 'Vinícius']
+_sobrenomes = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima',
+               'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Araújo']
+
+# Serviço: (peso na procura, valor mínimo, valor máximo)
+_servicos = {
+    'Corte': (40, 35, 60),
+    'Barba': (20, 25, 40),
+    'Corte e Barba': (25, 55, 90),
+    'Sobrancelha': (8, 15, 25),
+    'Pigmentação': (4, 40, 70),
+    'Hidratação': (3, 30, 50),
+}
+
+
+def _cpf_sequencial(numero):
+    digitos = [int(d) for d in f"{numero:09d}"]
+    for n in (9, 10):
+        soma = sum(d * peso for d, peso in zip(digitos, range(n + 1, 1, -1)))
+        digitos.append(soma * 10 % 11 % 10)
+    texto = ''.join(map(str, digitos))
+    return f"{texto[:3]}.{texto[3:6]}.{texto[6:9]}-{texto[9:]}"
+
+
+def _gerar_usuarios(rng, quantidade):
+    # CPFs sequenciais a partir de 100000000 são únicos e válidos
+    for i in range(quantidade):
+        nome, sobrenome = rng.choice(_nomes), rng.choice(_sobrenomes)
+        email = unicodedata.normalize('NFKD', f"{nome}.{sobrenome}{i}").encode('ascii', 'ignore').decode().lower()
+        nascimento = datetime.date(1950, 1, 1) + datetime.timedelta(days=rng.randrange(21000))
+        genero = rng.choices(['Masculino', 'Feminino', 'Outro'], weights=[70, 28, 2])[0]
+        yield (
+            f"{nome} {sobrenome}", _cpf_sequencial(100000000 + i),
+            f"({rng.randint(11, 99)}) 9{rng.randint(1000, 9999)}-{rng.randint(0, 9999):04d}",
+            f"{email}@exemplo.com", f"senha{i}",
+            nascimento.isoformat(), genero,
+        )
+
+
+def _gerar_agendamentos(rng, quantidade, usuarios, inicio, fim):
+    servicos = list(_servicos)
+    pesos = [_servicos[servico][0] for servico in servicos]
+    dias = (fim - inicio).days + 1
+    for _ in range(quantidade):
+        # Poucos clientes voltam muitas vezes: distribuição exponencial sobre os CPFs
+        cliente = int(rng.expovariate(4 / usuarios)) % usuarios
+        data = inicio + datetime.timedelta(days=rng.randrange(dias))
+        if data.weekday() == 6:  # domingo fechado: segunda-feira, ou sábado se o domingo for o último dia
+            data += datetime.timedelta(days=1 if data < fim else -1)
+        servico = rng.choices(servicos, weights=pesos)[0]
+        _, minimo, maximo = _servicos[servico]
+        yield (
+            _cpf_sequencial(100000000 + cliente),
+            f"{rng.randint(9, 19):02d}:{rng.choice((0, 30)):02d}:00",
+            data.isoformat(), f"{rng.uniform(minimo, maximo):.2f}", servico,
+        )
+
+
+class _FluxoCopy:
+    """Arquivo somente leitura que gera as linhas do COPY sob demanda, sem montar o conjunto na memória."""
+
+    def __init__(self, registros):
+        self._linhas = ('\t'.join(registro) + '\n' for registro in registros)
+        self._buffer = b''
+
+    def read(self, tamanho=-1):
+        while tamanho < 0 or len(self._buffer) < tamanho:
+            linha = next(self._linhas, None)
+            if linha is None:
+                break
+            self._buffer += linha.encode('utf-8')
+        if tamanho < 0:
+            tamanho = len(self._buffer)
+        dados, self._buffer = self._buffer[:tamanho], self._buffer[tamanho:]
+        return dados
+
+
+# flask --app app db gerar-dados --usuarios 100000 --agendamentos 1000000 --anos 3 --semente 42
+@db_cli.command('gerar-dados')
+@click.option('--usuarios', type=int, default=10000, show_default=True)
+@click.option('--agendamentos', type=int, default=100000, show_default=True)
+@click.option('--anos', type=int, default=3, show_default=True, help='Anos de histórico até --fim.')
+@click.option('--fim', default='2025-12-31', show_default=True, help='Data do último agendamento (YYYY-MM-DD).')
+@click.option('--semente', type=int, default=42, show_default=True)
+@click.option('--limpar', is_flag=True, help='Apaga usuários, agendamentos e tabelas derivadas antes de carregar.')
+def db_gerar_dados(usuarios, agendamentos, anos, fim, semente, limpar):
+    """Gera e carrega com COPY um conjunto de dados determinístico."""
+    fim = datetime.date.fromisoformat(fim)
+    inicio = _somar_meses(fim, 1 - 12 * anos)
+    rng = random.Random(semente)
+    comeco = time.perf_counter()
+
+    with transacao() as cursor:
+        cursor.execute("SET LOCAL statement_timeout = 0;")
+        if limpar:
+            cursor.execute("TRUNCATE Agendamento, Usuario, Outbox, Auditoria, Relatorio_Diario RESTART IDENTITY CASCADE;")
+        criar_particoes(cursor, inicio, fim)
+
+        # Sem um pg_notify por linha carregada; se a carga falhar, o rollback desfaz também o DISABLE
+        cursor.execute("ALTER TABLE Agendamento DISABLE TRIGGER agendamento_notificar;")
+        cursor.copy_expert(
+            "COPY Usuario (Nome, CPF, Telefone, Email, Senha, Data_Nascimento, Genero) FROM STDIN",
+            _FluxoCopy(_gerar_usuarios(rng, usuarios))
+        )
+        cursor.copy_expert(
+            "COPY Agendamento (CPF, Hora_Agendamento, Data_Agendamento, Valor, Servico) FROM STDIN",
+            _FluxoCopy(_gerar_agendamentos(rng, agendamentos, usuarios, inicio, fim))
+        )
+        cursor.execute("ALTER TABLE Agendamento ENABLE TRIGGER agendamento_notificar;")
+
+        # O resumo diário normalmente é mantido pela outbox, que o COPY não passa
+        cursor.execute(
+            """
+            INSERT INTO Relatorio_Diario (Data, Servico, Quantidade, Valor_Total)
+            SELECT Data_Agendamento, Servico, count(*), sum(Valor)
+            FROM Agendamento
+            WHERE Data_Agendamento BETWEEN %s AND %s
+            GROUP BY Data_Agendamento, Servico
+            ON CONFLICT (Data, Servico) DO UPDATE
+            SET Quantidade = Relatorio_Diario.Quantidade + EXCLUDED.Quantidade,
+                Valor_Total = Relatorio_Diario.Valor_Total + EXCLUDED.Valor_Total;
+            """,
+            (inicio, fim)
+        )
+
+    with transacao() as cursor:
+        cursor.execute("ANALYZE Usuario;")
+        cursor.execute("ANALYZE Agendamento;")
+
+    print(
+        f"{usuarios} usuários e {agendamentos} agendamentos de {inicio} a {fim} "
+        f"carregados em {time.perf_counter() - comeco:.1f}s"
+    )
+
+
+app.cli.add_command(db_cli)
+
+
+#---------------------------------------DOCUMENTAÇÃO SWAGGER---------------------------------------------
+
+# O Flasgger só é importado quando a documentação está habilitada, o que reduz o tempo de inicialização
+# dos workers em produção. Se existir um openapi.json gerado pelo comando `flask gerar-openapi`, ele é
+# usado como especificação em cache e as docstrings das rotas não precisam ser lidas novamente.
+def configurar_swagger(app):
+    if not app_config['swagger']:
+        return None
+
+    try:
+        from flasgger import Swagger
+    except ImportError:
+        print("Flasgger não instalado, documentação Swagger desabilitada.")
+        return None
+
+    swagger = Swagger(app)
+    if os.path.exists(app_config['openapi_arquivo']):
+        with open(app_config['openapi_arquivo'], encoding='utf-8') as arquivo:
+            swagger.apispecs['apispec_1'] = json.load(arquivo)
+    return swagger
+
+
+swagger = configurar_swagger(app)
+
+
+# Comando para gerar a especificação OpenAPI durante o build: flask --app app gerar-openapi
+@app.cli.command('gerar-openapi')
+def gerar_openapi():
+    """Gera o arquivo openapi.json a partir das docstrings das rotas."""
+    if swagger is None:
+        print("Documentação Swagger desabilitada, nada a gerar.")
+        return
+
+    with app.test_request_context():
+        swagger.apispecs.pop('apispec_1', None)
+        specs = swagger.get_apispecs('apispec_1')
+
+    with open(app_config['openapi_arquivo'], 'w', encoding='utf-8') as arquivo:
+        json.dump(specs, arquivo, ensure_ascii=False, indent=2)
+    print(f"Especificação OpenAPI gravada em {app_config['openapi_arquivo']}")
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    iniciar_job_particoes()
+    app.run(host='0.0.0.0', port=5000, debug=not app_config['producao'])
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""Mede o tempo de inicialização a frio da API.
+
+Cada repetição sobe um interpretador novo, importa o app e faz a primeira requisição à
+especificação do Swagger, como acontece quando o autoscaling cria um worker.
+
+Uso: python benchmarks/cold_start.py [--repeticoes 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CODIGO = """
+import time
+inicio = time.perf_counter()
+import app
+importado = time.perf_counter()
+resposta = app.app.test_client().get('/apispec_1.json')
+fim = time.perf_counter()
+print(importado - inicio, fim - importado if resposta.status_code == 200 else 0.0)
+"""
+
+CENARIOS = {
+    'desenvolvimento (Swagger)': {'BARBEARIA_AMBIENTE': '', 'BARBEARIA_SWAGGER': '1'},
+    'producao (sem Swagger)': {'BARBEARIA_AMBIENTE': 'producao', 'BARBEARIA_SWAGGER': '0'},
+}
+
+
+def medir(ambiente, repeticoes):
+    processos, imports, specs = [], [], []
+    env = dict(os.environ, **ambiente)
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        saida = subprocess.run(
+            [sys.executable, '-c', CODIGO], cwd=RAIZ, env=env,
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+        processos.append(time.perf_counter() - inicio)
+        imports.append(float(saida[-2]))
+        specs.append(float(saida[-1]))
+    return processos, imports, specs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticoes', type=int, default=10)
+    args = parser.parse_args()
+
+    if os.path.exists(os.path.join(RAIZ, 'openapi.json')):
+        print("Usando openapi.json pré-gerado (flask --app app gerar-openapi)")
+
+    print(f"{'cenário':<28}{'processo (ms)':>15}{'import (ms)':>14}{'1ª spec (ms)':>15}")
+    for nome, ambiente in CENARIOS.items():
+        processos, imports, specs = medir(ambiente, args.repeticoes)
+        print(
+            f"{nome:<28}{statistics.median(processos) * 1000:>15.1f}"
+            f"{statistics.median(imports) * 1000:>14.1f}{statistics.median(specs) * 1000:>15.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
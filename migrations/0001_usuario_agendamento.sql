@@ -0,0 +1,30 @@
+-- Tabelas principais: Usuario e Agendamento (particionada por mês em Data_Agendamento)
+
+CREATE TABLE Usuario (
+  Nome VARCHAR(100),
+  CPF VARCHAR(14) PRIMARY KEY,
+  Telefone VARCHAR(15),
+  Email VARCHAR(100) UNIQUE,
+  Senha VARCHAR(50),
+  Data_Nascimento DATE,
+  Genero VARCHAR(20)
+);
+
+CREATE TABLE Agendamento (
+  Id_Agendamento SERIAL,
+  CPF VARCHAR(14) REFERENCES Usuario(CPF),
+  Hora_Agendamento TIME,
+  Data_Agendamento DATE NOT NULL,
+  Valor DECIMAL(10, 2) CHECK (Valor >= 0),
+  Servico VARCHAR(100),
+  PRIMARY KEY (Id_Agendamento, Data_Agendamento)
+) PARTITION BY RANGE (Data_Agendamento);
+
+-- Datas sem partição mensal própria; o job de partições move essas linhas ao criar o mês
+CREATE TABLE agendamento_padrao PARTITION OF Agendamento DEFAULT;
+
+-- Agendamentos de um cliente e chave estrangeira para Usuario
+CREATE INDEX agendamento_cpf_idx ON Agendamento (CPF);
+
+-- Agenda de um dia
+CREATE INDEX agendamento_data_hora_idx ON Agendamento (Data_Agendamento, Hora_Agendamento);
@@ -0,0 +1,33 @@
+-- Tarefas assíncronas (outbox) e as tabelas alimentadas por elas
+
+CREATE TABLE Outbox (
+  Id_Outbox BIGSERIAL PRIMARY KEY,
+  Tipo VARCHAR(50) NOT NULL,
+  Carga JSONB NOT NULL,
+  Criado_Em TIMESTAMPTZ NOT NULL DEFAULT now(),
+  Processado_Em TIMESTAMPTZ,
+  Tentativas INTEGER NOT NULL DEFAULT 0,
+  Proxima_Tentativa TIMESTAMPTZ NOT NULL DEFAULT now(),
+  Erro TEXT
+);
+
+-- Varredura de tarefas pendentes; tarefas processadas ficam fora do índice
+CREATE INDEX outbox_pendentes_idx ON Outbox (Proxima_Tentativa) WHERE Processado_Em IS NULL;
+
+CREATE TABLE Auditoria (
+  Id_Auditoria BIGSERIAL PRIMARY KEY,
+  Tabela VARCHAR(50),
+  Operacao VARCHAR(10),
+  Registro VARCHAR(50),
+  Dados JSONB,
+  Criado_Em TIMESTAMPTZ DEFAULT now()
+);
+
+-- Resumo diário por serviço, atualizado pela outbox a cada novo agendamento
+CREATE TABLE Relatorio_Diario (
+  Data DATE,
+  Servico VARCHAR(100),
+  Quantidade INTEGER NOT NULL DEFAULT 0,
+  Valor_Total DECIMAL(12, 2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (Data, Servico)
+);
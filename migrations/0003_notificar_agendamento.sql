@@ -0,0 +1,27 @@
+-- Notifica o canal 'agendamentos' a cada alteração, usado por GET /agendamentos/stream
+
+CREATE FUNCTION notificar_agendamento() RETURNS trigger AS $$
+DECLARE
+  registro Agendamento%ROWTYPE;
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    registro := OLD;
+  ELSE
+    registro := NEW;
+  END IF;
+  PERFORM pg_notify('agendamentos', json_build_object(
+    'operacao', TG_OP,
+    'Id_Agendamento', registro.Id_Agendamento,
+    'CPF', registro.CPF,
+    'Hora_Agendamento', registro.Hora_Agendamento,
+    'Data_Agendamento', registro.Data_Agendamento,
+    'Data_Anterior', CASE WHEN TG_OP = 'UPDATE' THEN OLD.Data_Agendamento END,
+    'Valor', registro.Valor,
+    'Servico', registro.Servico
+  )::text);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER agendamento_notificar AFTER INSERT OR UPDATE OR DELETE ON Agendamento
+  FOR EACH ROW EXECUTE FUNCTION notificar_agendamento();
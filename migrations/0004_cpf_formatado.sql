@@ -0,0 +1,21 @@
+-- CPF passa a ser gravado sempre no formato 000.000.000-00 (o mesmo da importação em lote)
+
+-- A troca do CPF de um usuário é propagada aos seus agendamentos
+ALTER TABLE Agendamento
+  DROP CONSTRAINT agendamento_cpf_fkey,
+  ADD CONSTRAINT agendamento_cpf_fkey FOREIGN KEY (CPF) REFERENCES Usuario(CPF) ON UPDATE CASCADE;
+
+-- A propagação não deve gerar um evento por agendamento em /agendamentos/stream
+ALTER TABLE Agendamento DISABLE TRIGGER agendamento_notificar;
+
+-- CPFs gravados só com dígitos; se o mesmo CPF já existe formatado, o cadastro duplicado fica como está
+-- e precisa ser unificado à mão
+UPDATE Usuario u
+SET CPF = regexp_replace(u.CPF, '^(\d{3})(\d{3})(\d{3})(\d{2})$', '\1.\2.\3-\4')
+WHERE u.CPF ~ '^\d{11}$'
+  AND NOT EXISTS (
+    SELECT 1 FROM Usuario f
+    WHERE f.CPF = regexp_replace(u.CPF, '^(\d{3})(\d{3})(\d{3})(\d{2})$', '\1.\2.\3-\4')
+  );
+
+ALTER TABLE Agendamento ENABLE TRIGGER agendamento_notificar;
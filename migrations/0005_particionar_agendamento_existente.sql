@@ -0,0 +1,56 @@
+-- Converte a tabela Agendamento de bancos criados antes das migrações (sem partições) no formato da 0001.
+-- Nesses bancos a 0001 é marcada como aplicada com `flask --app app db marcar 0001_usuario_agendamento`.
+-- Em bancos criados pela 0001 a tabela já é particionada e nada é feito.
+
+DO $$
+DECLARE
+  sem_data BIGINT;
+  mes DATE;
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = 'agendamento'::regclass) = 'p' THEN
+    RETURN;
+  END IF;
+
+  SELECT count(*) INTO sem_data FROM Agendamento WHERE Data_Agendamento IS NULL;
+  IF sem_data > 0 THEN
+    RAISE EXCEPTION 'Existem % agendamentos sem Data_Agendamento; preencha a data antes de migrar', sem_data;
+  END IF;
+
+  LOCK TABLE Agendamento IN ACCESS EXCLUSIVE MODE;
+  ALTER TABLE Agendamento RENAME TO agendamento_antigo;
+  ALTER INDEX agendamento_pkey RENAME TO agendamento_antigo_pkey;
+
+  CREATE TABLE Agendamento (
+    Id_Agendamento INTEGER NOT NULL DEFAULT nextval('agendamento_id_agendamento_seq'),
+    CPF VARCHAR(14) REFERENCES Usuario(CPF) ON UPDATE CASCADE,
+    Hora_Agendamento TIME,
+    Data_Agendamento DATE NOT NULL,
+    Valor DECIMAL(10, 2) CHECK (Valor >= 0),
+    Servico VARCHAR(100),
+    PRIMARY KEY (Id_Agendamento, Data_Agendamento)
+  ) PARTITION BY RANGE (Data_Agendamento);
+
+  -- A sequência continua a mesma, então os ids existentes e os próximos não mudam
+  ALTER SEQUENCE agendamento_id_agendamento_seq OWNED BY Agendamento.Id_Agendamento;
+
+  CREATE TABLE agendamento_padrao PARTITION OF Agendamento DEFAULT;
+  FOR mes IN SELECT DISTINCT date_trunc('month', Data_Agendamento)::date FROM agendamento_antigo ORDER BY 1 LOOP
+    EXECUTE format(
+      'CREATE TABLE %I PARTITION OF Agendamento FOR VALUES FROM (%L) TO (%L)',
+      'agendamento_' || to_char(mes, 'YYYY_MM'), mes, (mes + interval '1 month')::date
+    );
+  END LOOP;
+
+  INSERT INTO Agendamento (Id_Agendamento, CPF, Hora_Agendamento, Data_Agendamento, Valor, Servico)
+  SELECT Id_Agendamento, CPF, Hora_Agendamento, Data_Agendamento, Valor, Servico FROM agendamento_antigo;
+
+  CREATE INDEX agendamento_cpf_idx ON Agendamento (CPF);
+  CREATE INDEX agendamento_data_hora_idx ON Agendamento (Data_Agendamento, Hora_Agendamento);
+
+  -- Criado depois da cópia para não notificar cada linha movida
+  CREATE TRIGGER agendamento_notificar AFTER INSERT OR UPDATE OR DELETE ON Agendamento
+    FOR EACH ROW EXECUTE FUNCTION notificar_agendamento();
+
+  DROP TABLE agendamento_antigo;
+END;
+$$;
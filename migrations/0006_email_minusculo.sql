@@ -0,0 +1,14 @@
+-- Email passa a ser gravado sempre em minúsculas (ver normalizar_email)
+
+-- Emails já gravados com maiúsculas. Se o email em minúsculas já existe (ou se repete entre variações do
+-- mesmo email), só um cadastro é convertido e os demais ficam como estão para serem unificados à mão.
+UPDATE Usuario u
+SET Email = lower(trim(u.Email))
+FROM (
+  SELECT DISTINCT ON (lower(trim(Email))) CPF
+  FROM Usuario
+  WHERE Email <> lower(trim(Email))
+  ORDER BY lower(trim(Email)), CPF
+) convertidos
+WHERE u.CPF = convertidos.CPF
+  AND NOT EXISTS (SELECT 1 FROM Usuario m WHERE m.Email = lower(trim(u.Email)));
@@ -0,0 +1,305 @@
+import threading
+import time
+
+import psycopg2.extensions
+import pytest
+
+import app
+
+
+class CursorFalso:
+    def __init__(self, connection=None):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, *args):
+        pass
+
+    def fetchone(self):
+        # Única consulta com resultado feita pelas conexões: o atraso de replicação
+        return (self.connection.atraso,)
+
+
+class InfoFalsa:
+    transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+class ConexaoFalsa:
+    """Usa a mesma lógica de close() do ConexaoPool sem precisar de um servidor PostgreSQL."""
+
+    close = app.ConexaoPool.close
+    devolver = None
+    emprestimo = None
+    dentro_do_pool = False
+    atraso = 0.0
+
+    def __init__(self):
+        self.closed = 0
+        self.info = InfoFalsa()
+        self.confirmadas = 0
+        self.desfeitas = 0
+
+    def _fechar(self):
+        self.closed = 1
+
+    def cursor(self):
+        return CursorFalso(self)
+
+    def commit(self):
+        self.confirmadas += 1
+
+    def rollback(self):
+        self.desfeitas += 1
+
+
+class PoolTeste(app.PoolConexoes):
+    """PoolConexoes de verdade (com o _putconn do psycopg2) criando conexões falsas."""
+
+    def __init__(self, minconn, maxconn, atraso=0.0):
+        self.criadas = 0
+        self.atraso = atraso
+        super().__init__(minconn, maxconn)
+
+    def _connect(self, key=None):
+        self.criadas += 1
+        conn = ConexaoFalsa()
+        conn.atraso = self.atraso
+        if key is not None:
+            self._used[key] = conn
+            self._rused[id(conn)] = key
+        else:
+            self._pool.append(conn)
+        return conn
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = PoolTeste(1, app.pool_config['maximo'])
+    monkeypatch.setattr(app._primario, 'pool', lambda: pool)
+    monkeypatch.setattr(app, '_replicas', [])
+    return pool
+
+
+class PoolQuebrado:
+    def getconn(self):
+        raise psycopg2.OperationalError('conexão recusada')
+
+
+@pytest.fixture
+def replica(pool, monkeypatch):
+    replica = app.BancoDados('replica1', {})
+    monkeypatch.setattr(app, '_replicas', [replica])
+    return replica
+
+
+def test_teardown_nao_devolve_conexao_emprestada_a_outra_requisicao(pool):
+    devolvida = threading.Event()
+    emprestada = threading.Event()
+    teardown_feito = threading.Event()
+    resultado = {}
+
+    def requisicao_a():
+        with app.app.test_request_context('/agendamentos'):
+            connection = app.connect_to_database()
+            connection.close()
+            devolvida.set()
+            emprestada.wait(5)
+            app.devolver_conexoes_pendentes(None)
+            teardown_feito.set()
+
+    def requisicao_b():
+        devolvida.wait(5)
+        with app.app.test_request_context('/agendamentos'):
+            connection = app.connect_to_database()
+            emprestada.set()
+            teardown_feito.wait(5)
+            resultado['ainda_emprestada'] = connection.devolver is not None
+            resultado['vagas'] = app._admissao._value
+            connection.close()
+            resultado['fechada'] = connection.closed
+            app.devolver_conexoes_pendentes(None)
+
+    vazadas = app.conexoes_metricas['vazadas']
+    threads = [threading.Thread(target=requisicao_a), threading.Thread(target=requisicao_b)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert resultado == {'ainda_emprestada': True, 'vagas': app.pool_config['maximo'] - 1, 'fechada': 0}
+    assert len(pool._pool) == 1
+    assert app._admissao._value == app.pool_config['maximo']
+    assert app.conexoes_metricas['vazadas'] == vazadas
+
+
+def test_teardown_devolve_conexao_esquecida_pela_rota(pool):
+    vazadas = app.conexoes_metricas['vazadas']
+    with app.app.test_request_context('/agendamentos'):
+        app.connect_to_database()
+        app.devolver_conexoes_pendentes(None)
+
+    assert len(pool._pool) == 1
+    assert app._admissao._value == app.pool_config['maximo']
+    assert app.conexoes_metricas['vazadas'] == vazadas + 1
+
+
+def test_close_de_conexao_no_pool_nao_fecha_a_conexao(pool):
+    with app.app.test_request_context('/agendamentos'):
+        connection = app.connect_to_database()
+        connection.close()
+        connection.close()
+
+    assert connection.closed == 0
+    assert pool._pool == [connection]
+
+
+def test_transacao_desfaz_e_devolve_a_conexao_em_caso_de_erro(pool):
+    (connection,) = pool._pool
+    vazadas = app.conexoes_metricas['vazadas']
+    with app.app.test_request_context('/usuario/bulk'):
+        with app.transacao() as cursor:
+            cursor.execute("SELECT 1;")
+        with pytest.raises(ValueError):
+            with app.transacao() as cursor:
+                raise ValueError
+        app.devolver_conexoes_pendentes(None)
+
+    assert (connection.confirmadas, connection.desfeitas) == (1, 1)
+    assert pool._pool == [connection]
+    assert app._admissao._value == app.pool_config['maximo']
+    assert app.conexoes_metricas['vazadas'] == vazadas
+
+
+def test_pool_mantem_as_conexoes_devolvidas_abertas(pool):
+    with app.app.test_request_context('/agendamentos'):
+        conexoes = [app.connect_to_database() for _ in range(5)]
+        for connection in conexoes:
+            connection.close()
+
+        assert [connection.closed for connection in conexoes] == [0] * 5
+        assert all(connection.dentro_do_pool for connection in conexoes)
+
+        novas = [app.connect_to_database() for _ in range(5)]
+        for connection in novas:
+            connection.close()
+
+    assert pool.criadas == 5
+    assert len(pool._pool) == 5
+
+
+def test_pool_fecha_de_verdade_a_conexao_descartada(pool):
+    with app.app.test_request_context('/agendamentos'):
+        connection = app.connect_to_database()
+        connection.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+        connection.close()
+
+    assert connection.closed == 1
+    assert not connection.dentro_do_pool
+    assert pool._pool == []
+
+
+def test_leitura_no_primario_durante_a_janela_do_cookie():
+    cookie = app.replica_config['cookie']
+    janela = app.replica_config['janela_leitura_propria']
+
+    with app.app.test_request_context('/agendamentos', headers={'Cookie': f'{cookie}={time.time()}'}):
+        assert app._leitura_no_primario()
+    with app.app.test_request_context('/agendamentos', headers={'Cookie': f'{cookie}={time.time() - janela - 1}'}):
+        assert not app._leitura_no_primario()
+    with app.app.test_request_context('/agendamentos', headers={'Cookie': f'{cookie}=invalido'}):
+        assert not app._leitura_no_primario()
+    with app.app.test_request_context('/agendamentos'):
+        assert not app._leitura_no_primario()
+        app.g.escreveu = True
+        assert app._leitura_no_primario()
+
+
+def test_leitura_usa_replica_e_escrita_usa_primario(pool, replica, monkeypatch):
+    pool_replica = PoolTeste(1, 2)
+    monkeypatch.setattr(replica, 'pool', lambda: pool_replica)
+    with app.app.test_request_context('/agendamentos'):
+        leitura = app.connect_to_database(somente_leitura=True)
+        assert leitura.banco is replica
+        leitura.close()
+        escrita = app.connect_to_database()
+        assert escrita.banco is app._primario
+        escrita.close()
+
+    assert app._admissao._value == app.pool_config['maximo']
+
+
+def test_replica_atrasada_e_trocada_pelo_primario(pool, replica, monkeypatch):
+    pool_replica = PoolTeste(1, 2, atraso=app.replica_config['atraso_maximo'] + 1)
+    monkeypatch.setattr(replica, 'pool', lambda: pool_replica)
+    with app.app.test_request_context('/agendamentos'):
+        connection = app.connect_to_database(somente_leitura=True)
+        assert connection.banco is app._primario
+        connection.close()
+
+        # O atraso medido vale por intervalo_verificacao: a réplica não é consultada de novo
+        pool_replica.atraso = 0.0
+        pool_replica._pool[0].atraso = 0.0
+        connection = app.connect_to_database(somente_leitura=True)
+        assert connection.banco is app._primario
+        connection.close()
+
+    assert replica.atraso > app.replica_config['atraso_maximo']
+    assert len(pool_replica._pool) == 1 and pool_replica._pool[0].closed == 0
+
+
+def test_replica_fora_do_ar_usa_o_primario(pool, replica, monkeypatch):
+    monkeypatch.setattr(replica, 'pool', PoolQuebrado)
+    with app.app.test_request_context('/agendamentos'):
+        connection = app.connect_to_database(somente_leitura=True)
+        assert connection.banco is app._primario
+        connection.close()
+
+    assert replica.disjuntor.falhas == 1
+    assert app._admissao._value == app.pool_config['maximo']
+
+
+def test_disjuntor_abre_apos_o_limite_e_libera_uma_tentativa_meio_aberta():
+    disjuntor = app.Disjuntor(limite_falhas=3, tempo_aberto=30)
+    for _ in range(2):
+        disjuntor.registrar_falha()
+    assert disjuntor.permitir() == 0
+
+    disjuntor.registrar_falha()
+    assert 0 < disjuntor.permitir() <= 30
+
+    # Tempo aberto esgotado: só a primeira chamada passa, as outras esperam o resultado dela
+    disjuntor.aberto_ate = time.monotonic() - 1
+    assert disjuntor.permitir() == 0
+    assert disjuntor.permitir() > 0
+
+    disjuntor.registrar_sucesso()
+    assert disjuntor.permitir() == 0
+
+
+def test_admissao_esgotada_responde_503_com_retry_after(pool, monkeypatch):
+    monkeypatch.setattr(app, '_admissao', threading.BoundedSemaphore(1))
+    monkeypatch.setitem(app.pool_config, 'espera_maxima', 0.01)
+    app._admissao.acquire()
+
+    resposta = app.app.test_client().get('/usuario/52998224725')
+
+    assert resposta.status_code == 503
+    assert resposta.headers['Retry-After'] == str(app.pool_config['retry_after'])
+    assert pool.criadas == 1  # nenhuma conexão nova foi aberta
+
+
+def test_disjuntor_aberto_responde_503_com_o_tempo_restante(pool, monkeypatch):
+    disjuntor = app.Disjuntor(limite_falhas=1, tempo_aberto=30)
+    disjuntor.registrar_falha()
+    monkeypatch.setattr(app._primario, 'disjuntor', disjuntor)
+
+    resposta = app.app.test_client().get('/usuario/52998224725')
+
+    assert resposta.status_code == 503
+    assert 0 < int(resposta.headers['Retry-After']) <= 30
+    assert app._admissao._value == app.pool_config['maximo']
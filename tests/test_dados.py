@@ -0,0 +1,30 @@
+import datetime
+import random
+
+import app
+
+
+def gerar(semente, inicio, fim):
+    rng = random.Random(semente)
+    usuarios = list(app._gerar_usuarios(rng, 50))
+    agendamentos = list(app._gerar_agendamentos(rng, 5000, 50, inicio, fim))
+    return usuarios, agendamentos
+
+
+def test_gerar_dados_e_deterministico():
+    inicio, fim = datetime.date(2023, 1, 1), datetime.date(2025, 12, 31)
+    assert gerar(42, inicio, fim) == gerar(42, inicio, fim)
+    assert gerar(42, inicio, fim) != gerar(43, inicio, fim)
+
+
+def test_agendamentos_ficam_no_periodo_e_fora_dos_domingos():
+    # 2023-01-01 e 2023-01-29 são domingos: os sorteios nas pontas não podem sair do período
+    for inicio, fim in [(datetime.date(2023, 1, 1), datetime.date(2025, 12, 31)),
+                        (datetime.date(2023, 1, 1), datetime.date(2023, 1, 29))]:
+        usuarios, agendamentos = gerar(42, inicio, fim)
+        cpfs = {usuario[1] for usuario in usuarios}
+        datas = [datetime.date.fromisoformat(agendamento[2]) for agendamento in agendamentos]
+
+        assert inicio <= min(datas) and max(datas) <= fim
+        assert all(data.weekday() != 6 for data in datas)
+        assert {agendamento[0] for agendamento in agendamentos} <= cpfs
@@ -0,0 +1,72 @@
+import contextlib
+
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def baldes(monkeypatch):
+    # POST /usuario/bulk é limitado por ip; cada teste começa com os baldes cheios
+    monkeypatch.setattr(app, 'baldes', app.BaldesMemoria())
+
+
+def test_normalizar_cpf_aceita_numero_e_recusa_outros_tipos():
+    assert app.normalizar_cpf('529.982.247-25') == '529.982.247-25'
+    assert app.normalizar_cpf(52998224725) == '529.982.247-25'
+    assert app.normalizar_cpf(True) is None
+    assert app.normalizar_cpf([529, 982, 247, 25]) is None
+
+
+def test_chave_cpf_normaliza_ou_mantem_o_valor_recebido():
+    assert app.chave_cpf('52998224725') == '529.982.247-25'
+    assert app.chave_cpf('123') == '123'
+
+
+def test_validar_usuario_converte_numeros_e_recusa_por_linha():
+    valores, erro = app._validar_usuario({'Nome': 123, 'CPF': 52998224725, 'Email': 'A@B.com', 'Telefone': 11987654321})
+    assert erro is None
+    assert valores == ('123', '529.982.247-25', '(11) 98765-4321', 'a@b.com', None, None, None)
+
+    assert app._validar_usuario({'Nome': ['x'], 'CPF': '52998224725', 'Email': 'a@b.com'}) == (None, 'Nome inválido')
+    assert app._validar_usuario({'Nome': 'x', 'CPF': '52998224725', 'Email': {}}) == (None, 'Email inválido')
+
+
+def test_importacao_com_corpo_ilegivel_retorna_400_com_resumo():
+    resposta = app.app.test_client().post(
+        '/usuario/bulk', data=b'Nome,CPF,Email\n\xff\xfe,1,2\n', content_type='text/csv'
+    )
+
+    assert resposta.status_code == 400
+    assert resposta.get_json()['resumo']['total'] == 0
+
+
+def test_importacao_com_csv_malformado_retorna_400_com_resumo():
+    resposta = app.app.test_client().post(
+        '/usuario/bulk', data=b'Nome,CPF,Email\n' + b'x' * 200000 + b'\n', content_type='text/csv'
+    )
+
+    assert resposta.status_code == 400
+    assert resposta.get_json()['message'].startswith('CSV inválido')
+
+
+def test_normalizar_email_usa_minusculas_e_recusa_invalidos():
+    assert app.normalizar_email(' A@B.com ') == 'a@b.com'
+    assert app.normalizar_email('sem-arroba') is None
+    assert app.normalizar_email(123) is None
+
+
+def test_importacao_com_banco_indisponivel_retorna_503_com_resumo(monkeypatch):
+    @contextlib.contextmanager
+    def transacao(somente_leitura=False):
+        raise app.ServicoIndisponivel('Servidor sobrecarregado, tente novamente', 5)
+        yield
+
+    monkeypatch.setattr(app, 'transacao', transacao)
+    resposta = app.app.test_client().post(
+        '/usuario/bulk', data=b'Nome,CPF,Email\nAna,52998224725,x\nBia,11144477735,b@c.com\n', content_type='text/csv'
+    )
+
+    assert resposta.status_code == 503
+    assert resposta.headers['Retry-After'] == '5'
+    assert resposta.get_json()['resumo']['erros'] == 1
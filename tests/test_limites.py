@@ -0,0 +1,54 @@
+import app
+
+
+class ErroRedis(Exception):
+    pass
+
+
+def test_baldes_redis_usa_baldes_locais_quando_o_redis_falha():
+    def consumir(keys, args):
+        raise ErroRedis('conexão recusada')
+
+    # Sem o pacote redis instalado: monta o objeto sem passar pelo __init__
+    baldes = app.BaldesRedis.__new__(app.BaldesRedis)
+    baldes._consumir = consumir
+    baldes._erros = ErroRedis
+    baldes._reserva = app.BaldesMemoria()
+    baldes._indisponivel = False
+
+    assert baldes.consumir([('rota:ip:1', 1, 0.001)])[0] is True
+    assert baldes.consumir([('rota:ip:1', 1, 0.001)])[0] is False
+
+    baldes._consumir = lambda keys, args: [1, '4', '9']
+    assert baldes.consumir([('rota:ip:1', 5, 1.0), ('rota:api_key:a', 10, 1.0)]) == (True, [4.0, 9.0])
+    assert baldes._indisponivel is False
+
+
+def test_importacao_sem_api_key_e_limitada_por_ip(monkeypatch):
+    monkeypatch.setattr(app, 'baldes', app.BaldesMemoria())
+    cliente = app.app.test_client()
+
+    respostas = [
+        cliente.post('/usuario/bulk', data=b'', content_type='text/plain').status_code
+        for _ in range(3)
+    ]
+
+    assert respostas == [415, 415, 429]
+
+
+def test_requisicao_recusada_nao_gasta_tokens_nem_cria_baldes(monkeypatch):
+    baldes = app.BaldesMemoria()
+    monkeypatch.setattr(app, 'baldes', baldes)
+    cliente = app.app.test_client()
+
+    # Cada requisição troca de X-API-Key; a regra por ip recusa a partir da terceira
+    respostas = [
+        cliente.post('/usuario/bulk', data=b'', content_type='text/plain', headers={'X-API-Key': f'chave{i}'})
+        for i in range(4)
+    ]
+
+    assert [resposta.status_code for resposta in respostas] == [415, 415, 429, 429]
+    assert sorted(baldes._baldes) == [
+        'importar_usuarios:api_key:chave0', 'importar_usuarios:api_key:chave1', 'importar_usuarios:ip:127.0.0.1',
+    ]
+    assert respostas[2].headers['RateLimit-Remaining'] == '0'
@@ -0,0 +1,56 @@
+import contextlib
+import datetime
+import decimal
+
+import app
+
+
+class CursorFalso:
+    def __init__(self):
+        self.parametros = []
+
+    def execute(self, comando, parametros=None):
+        self.parametros.append(parametros)
+
+
+def test_relatorio_desfaz_dados_anteriores_na_alteracao_e_subtrai_na_exclusao():
+    anterior = app.carga_agendamento(
+        (7, '529.982.247-25', datetime.time(10, 0), datetime.date(2025, 3, 1), decimal.Decimal('35.00'), 'Corte')
+    )
+    carga = dict(anterior, Data_Agendamento='2025-03-02', Valor='50.00', Servico='Barba', Operacao='UPDATE', Anterior=anterior)
+
+    cursor = CursorFalso()
+    app._atualizar_relatorio(cursor, carga)
+    app._atualizar_relatorio(cursor, dict(anterior, Operacao='DELETE'))
+    app._atualizar_relatorio(cursor, {'Data_Agendamento': '2025-03-01', 'Servico': 'Corte', 'Valor': None})
+
+    assert cursor.parametros == [
+        ('2025-03-01', 'Corte', -1, -1, '35.00'),
+        ('2025-03-02', 'Barba', 1, 1, '50.00'),
+        ('2025-03-01', 'Corte', -1, -1, '35.00'),
+        ('2025-03-01', 'Corte', 1, 1, None),
+    ]
+
+
+def test_confirmacao_usa_o_notificador_configurado(monkeypatch):
+    enviadas = []
+    monkeypatch.setattr(app, 'notificar_confirmacao', enviadas.append)
+
+    app.manipuladores_outbox['confirmacao'](CursorFalso(), {'Id_Agendamento': 1})
+
+    assert enviadas == [{'Id_Agendamento': 1}]
+
+
+def test_metricas_separam_tarefas_mortas_do_atraso(monkeypatch):
+    cursor = CursorFalso()
+    cursor.fetchone = lambda: (3, decimal.Decimal('12.5'), 1)
+
+    @contextlib.contextmanager
+    def transacao(somente_leitura=False):
+        yield cursor
+
+    monkeypatch.setattr(app, 'transacao', transacao)
+    fila = app.app.test_client().get('/metricas').get_json()['fila']
+
+    assert (fila['pendentes'], fila['atraso_pendentes'], fila['mortas']) == (3, 12.5, 1)
+    assert cursor.parametros == [{'max': app.fila_config['max_tentativas']}]
@@ -0,0 +1,61 @@
+import contextlib
+import datetime
+
+import pytest
+
+import app
+
+
+class CursorFalso:
+    def __init__(self, particoes):
+        self.particoes = particoes
+        self.comandos = []
+
+    def execute(self, comando, *args):
+        self.comandos.append(comando)
+
+    def fetchall(self):
+        return [(nome,) for nome in self.particoes]
+
+
+def test_arquivar_nao_sobrescreve_arquivo_existente(tmp_path, monkeypatch):
+    cursor = CursorFalso(['agendamento_2020_01'])
+
+    @contextlib.contextmanager
+    def transacao(somente_leitura=False):
+        yield cursor
+
+    monkeypatch.setattr(app, 'transacao', transacao)
+    monkeypatch.setitem(app.particao_config, 'diretorio_arquivo', str(tmp_path))
+    existente = tmp_path / '2020_01.csv.gz'
+    existente.write_bytes(b'arquivo anterior')
+
+    assert app.arquivar_particoes(datetime.date(2021, 1, 1)) == []
+    assert existente.read_bytes() == b'arquivo anterior'
+    assert len(cursor.comandos) == 1  # apenas a listagem das partições, nenhum DROP
+
+
+class CursorCopia(CursorFalso):
+    def copy_expert(self, comando, arquivo):
+        arquivo.write(b'Id_Agendamento\n1\n')
+
+
+def test_arquivo_e_removido_se_o_commit_falhar(tmp_path, monkeypatch):
+    cursor = CursorCopia(['agendamento_2020_01'])
+    antes_do_commit = []
+
+    @contextlib.contextmanager
+    def transacao(somente_leitura=False):
+        yield cursor
+        if not somente_leitura:
+            antes_do_commit.append(cursor.comandos[-1])
+            raise app.psycopg2.errors.LockNotAvailable('lock timeout')
+
+    monkeypatch.setattr(app, 'transacao', transacao)
+    monkeypatch.setitem(app.particao_config, 'diretorio_arquivo', str(tmp_path))
+
+    with pytest.raises(app.psycopg2.errors.LockNotAvailable):
+        app.arquivar_particoes(datetime.date(2021, 1, 1))
+
+    assert 'DROP' in str(antes_do_commit[0])
+    assert list(tmp_path.iterdir()) == []
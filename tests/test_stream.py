@@ -0,0 +1,41 @@
+import json
+
+import app
+
+
+def esvaziar(assinante):
+    eventos = []
+    while not assinante.fila.empty():
+        eventos.append(assinante.fila.get_nowait())
+    return eventos
+
+
+def test_distribuir_filtra_pela_data_e_pela_data_anterior(monkeypatch):
+    todos, dia_1, dia_2, dia_3 = (
+        app.Assinante(), app.Assinante('2025-03-01'), app.Assinante('2025-03-02'), app.Assinante('2025-03-03')
+    )
+    monkeypatch.setattr(app, '_assinantes', {todos, dia_1, dia_2, dia_3})
+
+    inserido = json.dumps({'operacao': 'INSERT', 'Data_Agendamento': '2025-03-01', 'Data_Anterior': None})
+    # Um agendamento movido de um dia para outro interessa aos dois dias
+    movido = json.dumps({'operacao': 'UPDATE', 'Data_Agendamento': '2025-03-02', 'Data_Anterior': '2025-03-01'})
+    app._distribuir(inserido)
+    app._distribuir(movido)
+
+    assert esvaziar(todos) == [inserido, movido]
+    assert esvaziar(dia_1) == [inserido, movido]
+    assert esvaziar(dia_2) == [movido]
+    assert esvaziar(dia_3) == []
+
+
+def test_assinante_lento_recebe_apenas_o_pedido_de_ressincronizacao(monkeypatch):
+    monkeypatch.setitem(app.stream_config, 'tamanho_fila_assinante', 2)
+    assinante = app.Assinante()
+
+    for evento in ('a', 'b', 'c'):
+        assinante.enviar(evento)
+
+    assert esvaziar(assinante) == [None]
+
+    assinante.enviar('d')
+    assert esvaziar(assinante) == ['d']